@@ -0,0 +1,111 @@
+import asyncio
+import json
+from collections import Counter
+from itertools import count
+
+from aiohttp import web
+
+# Методы, которые возвращают отправленное или измененное сообщение
+MESSAGE_METHODS = {
+    "sendmessage",
+    "sendphoto",
+    "senddocument",
+    "editmessagemedia",
+    "editmessagecaption",
+    "editmessagereplymarkup",
+    "editmessagetext",
+}
+
+
+class FakeTelegramAPI:
+    """
+    Локальная замена Bot API для нагрузочных тестов.
+    Отвечает успехом на любой метод, считает вызовы и запоминает
+    последнюю inline-клавиатуру каждого чата, чтобы синтетические
+    покупатели могли нажимать реальные кнопки.
+    С flood_every каждый flood_every-й запрос получает 429
+    с retry_after, как при срабатывании flood control в Telegram.
+    wait_for() ждет ответа бота, когда апдейты обрабатываются в фоне
+    (вебхук): по числу сообщений в чате и ответам на callback-запросы.
+    """
+
+    def __init__(self, flood_every: int = 0, retry_after: int = 1) -> None:
+        self.calls = Counter()
+        self.flooded = 0
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self._requests = count(1)
+        self.keyboards: dict[int, list[list[dict]]] = {}
+        # chat_id -> сколько сообщений отправлено или изменено
+        self.messages = Counter()
+        self.answered: set[str] = set()
+        self._changed = asyncio.Condition()
+        self._message_ids = count(1)
+        self._runner: web.AppRunner | None = None
+        self.url = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = dict(await request.post())
+        if self.flood_every and next(self._requests) % self.flood_every == 0:
+            self.flooded += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests: retry after "
+                               f"{self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            })
+        self.calls[method] += 1
+        result = self.result(method, params)
+        async with self._changed:
+            self._changed.notify_all()
+        return web.json_response({"ok": True, "result": result})
+
+    async def wait_for(self, predicate, timeout: float = 30) -> None:
+        async with self._changed:
+            await asyncio.wait_for(self._changed.wait_for(predicate), timeout)
+
+    def result(self, method: str, params: dict):
+        if method == "getme":
+            return {"id": 42, "is_bot": True, "first_name": "shop_bot"}
+        if method == "sendmediagroup":
+            self.messages[int(params.get("chat_id", 0))] += 1
+            media = json.loads(params.get("media", "[]"))
+            return [self._message(params) for _ in media]
+        if method == "answercallbackquery":
+            self.answered.add(params.get("callback_query_id"))
+            return True
+        if method in MESSAGE_METHODS:
+            chat_id = int(params.get("chat_id", 0))
+            self.messages[chat_id] += 1
+            if "reply_markup" in params:
+                markup = json.loads(params["reply_markup"])
+                self.keyboards[chat_id] = markup.get("inline_keyboard", [])
+            return self._message(params)
+        return True
+
+    def _message(self, params: dict) -> dict:
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": next(self._message_ids),
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+        }
@@ -1,19 +1,84 @@
 import os
 import asyncio
+import logging
+import time
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import setup_application
+from aiohttp import web
 from dotenv import load_dotenv
 
-from database.engine import create_db, session_maker
+from database.catalog import catalog
+from database.engine import (
+    create_db,
+    engine,
+    primary_session_maker,
+    replica_engine,
+    session_maker,
+    warm_pool,
+)
+from database.fsm_storage import SQLStorage
+from database.notify import CatalogChangeListener
 from handlers import admin_handler, user_hendler
+from keyboards.inline import get_user_catalog_buttons, get_user_main_button
 from middlewares.db import DataBaseSession
+from middlewares.metrics import HandlerLabels, UpdateMetrics
+from middlewares.concurrency import ConcurrencyLimit, UserEventIsolation
+from utils.cart_taps import cart_taps
+from utils.flood_control import FloodControl, OutboundScheduler
+from utils.metrics import instrument_engine, start_metrics_server
+from utils.rendered_views import rendered_views
+from utils.user_registry import user_registry
+from utils.webhook import DrainingRequestHandler
+
 
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 ALLOWED_UPDATES = ['message', 'edited_message', 'callback_query']
 TOKEN = os.getenv('API_TOKEN')
+CATALOG_POLL_INTERVAL = float(os.getenv('CATALOG_POLL_INTERVAL', 5))
+DROP_PENDING_UPDATES = (
+    os.getenv('DROP_PENDING_UPDATES', 'false').lower() == 'true'
+)
+
+# BOT_MODE=webhook запускает aiohttp-сервер вместо long polling
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Пропуск повторных правок сообщений безопасен, только пока все апдейты
+# чата обрабатывает один процесс, а за вебхуком реплик может быть несколько
+RENDERED_VIEWS_TTL = float(os.getenv(
+    'RENDERED_VIEWS_TTL',
+    0 if BOT_MODE == 'webhook' else 60
+))
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', 30))
+WEBAPP_HOST = os.getenv('WEBAPP_HOST', '0.0.0.0')
+WEBAPP_PORT = int(os.getenv('WEBAPP_PORT', 8080))
+
+# Эндпоинт /metrics в формате Prometheus, без METRICS_PORT выключен
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+METRICS_PORT = os.getenv('METRICS_PORT')
+
+# Лимиты исходящих запросов к Bot API (в секунду)
+TG_GLOBAL_RATE = float(os.getenv('TG_GLOBAL_RATE', 30))
+TG_CHAT_RATE = float(os.getenv('TG_CHAT_RATE', 1))
+TG_CHAT_BURST = float(os.getenv('TG_CHAT_BURST', 3))
+TG_MAX_RETRIES = int(os.getenv('TG_MAX_RETRIES', 3))
+
+# FSM_STORAGE=sql хранит состояния в БД: они переживают рестарт
+# и общие для нескольких процессов за одним вебхуком
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory')
+# Кэш состояний только для одного процесса: записей других он не видит
+FSM_CACHE_TTL = float(os.getenv('FSM_CACHE_TTL', 0))
+
+# Сколько апдейтов обрабатывается одновременно (0 - без ограничения)
+MAX_CONCURRENT_UPDATES = int(os.getenv('MAX_CONCURRENT_UPDATES', 0))
 
 bot = Bot(
     token=TOKEN,
@@ -21,25 +86,144 @@ bot = Bot(
         parse_mode=ParseMode.HTML
     )
 )
+bot.session.middleware(FloodControl(
+    OutboundScheduler(
+        global_rate=TG_GLOBAL_RATE,
+        chat_rate=TG_CHAT_RATE,
+        chat_burst=TG_CHAT_BURST
+    ),
+    max_retries=TG_MAX_RETRIES
+))
+# Снимок каталога и FSM читаются из основной БД: реплика может
+# отставать от только что сделанных изменений
+catalog_listener = CatalogChangeListener(
+    engine,
+    primary_session_maker,
+    poll_interval=CATALOG_POLL_INTERVAL
+)
+metrics_runner = None
+rendered_views.ttl = RENDERED_VIEWS_TTL
+instrument_engine(engine)
+if replica_engine is not None:
+    instrument_engine(replica_engine)
+
+
+async def timed(phase: str, coro):
+    started = time.perf_counter()
+    result = await coro
+    logger.info(
+        'Startup phase "%s" took %.3f s',
+        phase,
+        time.perf_counter() - started
+    )
+    return result
+
+
+async def prepare_data():
+    # На актуальной базе миграции - один запрос версии схемы
+    await timed('migrations', create_db())
+    await timed('catalog', catalog.load(primary_session_maker))
+    get_user_main_button(level=0)
+    get_user_catalog_buttons(level=1, categories=catalog.get_categories())
 
 
 async def on_startup():
-    await create_db()
+    global metrics_runner
+    started = time.perf_counter()
+    await asyncio.gather(
+        timed('pool warmup', warm_pool()),
+        prepare_data(),
+    )
+    await catalog_listener.start()
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(
+            METRICS_HOST,
+            int(METRICS_PORT)
+        )
+    logger.info('Startup finished in %.3f s', time.perf_counter() - started)
 
 
 async def on_shutdown():
+    await cart_taps.close()
+    await user_registry.close()
+    await catalog_listener.stop()
+    if metrics_runner:
+        await metrics_runner.cleanup()
     print('bot shutdown')
 
 
-async def main():
-    dp = Dispatcher()
+def create_storage() -> BaseStorage:
+    if FSM_STORAGE == 'sql':
+        return SQLStorage(primary_session_maker, cache_ttl=FSM_CACHE_TTL)
+    if FSM_STORAGE == 'memory':
+        return MemoryStorage()
+    raise RuntimeError(f'Unknown FSM_STORAGE: {FSM_STORAGE}')
+
+
+def create_dispatcher() -> Dispatcher:
+    # Апдейты одного пользователя - строго по очереди: блокировка
+    # берется до чтения состояния FSM
+    dp = Dispatcher(
+        storage=create_storage(),
+        events_isolation=UserEventIsolation()
+    )
     dp.include_routers(admin_handler.router, user_hendler.router)
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
+    dp.update.outer_middleware(UpdateMetrics())
+    if MAX_CONCURRENT_UPDATES:
+        dp.update.outer_middleware(ConcurrencyLimit(MAX_CONCURRENT_UPDATES))
     dp.update.middleware(DataBaseSession(session_pool=session_maker))
-    await bot.delete_webhook(drop_pending_updates=True)
+    dp.message.middleware(HandlerLabels())
+    dp.callback_query.middleware(HandlerLabels())
+    return dp
+
+
+async def main():
+    dp = create_dispatcher()
+    await bot.delete_webhook(drop_pending_updates=DROP_PENDING_UPDATES)
     await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
 
 
+def create_webhook_app(dp: Dispatcher, bot: Bot = bot) -> web.Application:
+    if not WEBHOOK_SECRET:
+        raise RuntimeError('WEBHOOK_SECRET is required in webhook mode')
+
+    async def on_webhook_startup():
+        # Без WEBHOOK_URL вебхук считается уже настроенным
+        # (например, одной из реплик за балансировщиком)
+        if WEBHOOK_URL:
+            await bot.set_webhook(
+                f'{WEBHOOK_URL}{WEBHOOK_PATH}',
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types(),
+                drop_pending_updates=DROP_PENDING_UPDATES,
+            )
+
+    dp.startup.register(on_webhook_startup)
+    app = web.Application()
+    handler = DrainingRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        drain_timeout=WEBHOOK_DRAIN_TIMEOUT,
+    )
+    # Порядок остановки: дождаться апдейтов, выполнить shutdown
+    # диспетчера (он еще отправляет правки), закрыть сессию бота
+    handler.register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    app.on_shutdown.append(handler.close_bot_session)
+    return app
+
+
+def main_webhook():
+    app = create_webhook_app(create_dispatcher())
+    web.run_app(app, host=WEBAPP_HOST, port=WEBAPP_PORT)
+
+
 if __name__ == '__main__':
-    asyncio.run(main())
+    logging.basicConfig(level=logging.INFO)
+    if BOT_MODE == 'webhook':
+        main_webhook()
+    else:
+        asyncio.run(main())
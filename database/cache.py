@@ -0,0 +1,148 @@
+"""
+Read-through кэш для функций orm_query.
+
+    @cached("product", ttl=60)
+    async def orm_get_product(session, product_id): ...
+
+    invalidate("product")  # в функциях, которые меняют товары
+
+Ключ - аргументы функции без сессии. Одинаковые промахи, пришедшие
+одновременно, выполняют один запрос (single-flight), остальные ждут
+его результата. Функции должны возвращать отвязанные от сессии
+значения (records, кортежи), потому что результат делят все вызывающие.
+Промахи читаются из основной БД, а не с реплики (см. primary_reads).
+"""
+import asyncio
+import inspect
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from database.routing import primary_reads
+
+# Все кэши - для инвалидации по тегам и для /metrics
+caches: list["ReadThroughCache"] = []
+
+
+class ReadThroughCache:
+    __slots__ = (
+        "name",
+        "tags",
+        "ttl",
+        "maxsize",
+        "hits",
+        "misses",
+        "evictions",
+        "coalesced",
+        "_values",
+        "_inflight",
+        "_generation",
+    )
+
+    def __init__(self, name: str, tags: tuple[str, ...], ttl, maxsize):
+        self.name = name
+        self.tags = tags
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # промахи, дождавшиеся чужого запроса вместо своего
+        self.coalesced = 0
+        # ключ -> (истекает, значение)
+        self._values: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    async def get(self, key, load):
+        while True:
+            item = self._values.get(key)
+            if item is not None:
+                if item[0] > time.monotonic():
+                    self._values.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                del self._values[key]
+
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # Отменили того, кто выполнял запрос, а не нас: повторяем
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        try:
+            with primary_reads():
+                value = await load()
+        except BaseException as error:
+            if isinstance(error, Exception):
+                future.set_exception(error)
+                # Ошибку получат только ожидающие, без "never retrieved"
+                future.exception()
+            else:
+                future.cancel()
+            raise
+        else:
+            future.set_result(value)
+            # Данные поменялись, пока шел запрос - такое не сохраняем
+            if generation == self._generation:
+                self._store(key, value)
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        return value
+
+    def _store(self, key, value) -> None:
+        self._values[key] = (time.monotonic() + self.ttl, value)
+        self._values.move_to_end(key)
+        while len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._values.clear()
+        # Новые вызовы не должны ждать запросы, начатые до изменения
+        self._inflight.clear()
+        self._generation += 1
+
+
+def cached(*tags: str, ttl: float = 60, maxsize: int = 1024):
+    """Кэширует async-функцию от (session, *args), см. описание модуля."""
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        cache = ReadThroughCache(func.__name__, tags, ttl, maxsize)
+        caches.append(cache)
+
+        @wraps(func)
+        async def wrapper(session, *args, **kwargs):
+            bound = signature.bind(session, *args, **kwargs)
+            bound.apply_defaults()
+            key = tuple(bound.arguments.values())[1:]
+            return await cache.get(
+                key,
+                lambda: func(session, *args, **kwargs)
+            )
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def invalidate(*tags: str) -> None:
+    """Сбрасывает кэши, помеченные любым из tags (без tags - все)."""
+    for cache in caches:
+        if not tags or set(tags) & set(cache.tags):
+            cache.clear()
@@ -0,0 +1,106 @@
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database.models import Banner, Category, Product
+from database.notify import on_catalog_changed
+from database.records import BannerRecord, CategoryRecord, ProductRecord
+
+
+async def _load_banners(session: AsyncSession) -> list[BannerRecord]:
+    result = await session.execute(select(
+        Banner.id, Banner.name, Banner.image, Banner.description
+    ))
+    return [BannerRecord(*row) for row in result]
+
+
+async def _load_categories(session: AsyncSession) -> list[CategoryRecord]:
+    result = await session.execute(
+        select(Category.id, Category.name).order_by(Category.id)
+    )
+    return [CategoryRecord(*row) for row in result]
+
+
+async def _load_products(session: AsyncSession) -> list[ProductRecord]:
+    result = await session.execute(select(
+        Product.id,
+        Product.name,
+        Product.description,
+        Product.price,
+        Product.image,
+        Product.category_id,
+    ).order_by(Product.id))
+    return [ProductRecord(*row) for row in result]
+
+
+class CatalogSnapshot:
+    """Слепок баннеров, категорий и товаров на момент загрузки."""
+
+    __slots__ = ("banners", "categories", "products", "by_category")
+
+    def __init__(self, banners, categories, products):
+        self.banners = {banner.name: banner for banner in banners}
+        self.categories = tuple(categories)
+        self.products = {product.id: product for product in products}
+        by_category = {}
+        for product in products:
+            by_category.setdefault(product.category_id, []).append(product)
+        self.by_category = {
+            category_id: tuple(items)
+            for category_id, items in by_category.items()
+        }
+
+
+class Catalog:
+    """
+    Читающая модель каталога для меню 0-2 уровней.
+    Снимок пересобирается целиком и подменяется одной операцией,
+    поэтому читатели всегда видят согласованные данные.
+    """
+
+    def __init__(self) -> None:
+        self.snapshot: CatalogSnapshot | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None
+
+    async def refresh(self, session: AsyncSession) -> None:
+        async with self._lock:
+            self.snapshot = CatalogSnapshot(
+                await _load_banners(session),
+                await _load_categories(session),
+                await _load_products(session),
+            )
+
+    async def load(self, session_pool: async_sessionmaker) -> None:
+        """Как refresh(), но три таблицы читаются параллельно."""
+
+        async def fetch(loader):
+            async with session_pool() as session:
+                return await loader(session)
+
+        async with self._lock:
+            self.snapshot = CatalogSnapshot(*await asyncio.gather(
+                fetch(_load_banners),
+                fetch(_load_categories),
+                fetch(_load_products),
+            ))
+
+    def get_banner(self, name: str) -> BannerRecord | None:
+        return self.snapshot.banners.get(name)
+
+    def get_categories(self) -> tuple[CategoryRecord, ...]:
+        return self.snapshot.categories
+
+    def get_product(self, product_id: int) -> ProductRecord | None:
+        return self.snapshot.products.get(product_id)
+
+    def get_products(self, category_id: int) -> tuple[ProductRecord, ...]:
+        return self.snapshot.by_category.get(int(category_id), ())
+
+
+catalog = Catalog()
+on_catalog_changed(catalog.refresh)
@@ -1,38 +1,88 @@
+import asyncio
 import os
 from dotenv import load_dotenv
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine
 )
 
-from commands.text_for_db import categories, description_for_info_pages
+from database.migrations import migrate
 from database.models import Base
-from database.orm_query import (
-    orm_add_banner_description,
-    orm_create_categories
-)
+from database.routing import RoutingSession
 
 load_dotenv()
 
-engine = create_async_engine(os.getenv("DB_URL"), echo=True)
+# Размер пула задается только явно: у SQLite в памяти пула нет
+POOL_OPTIONS = {
+    option: int(os.getenv(env))
+    for option, env in (
+        ("pool_size", "DB_POOL_SIZE"),
+        ("max_overflow", "DB_MAX_OVERFLOW"),
+    )
+    if os.getenv(env)
+}
+
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+engine = create_async_engine(
+    os.getenv("DB_URL"),
+    echo=DB_ECHO,
+    **POOL_OPTIONS
+)
 
-session_maker = async_sessionmaker(
+# Реплика только для чтения; без нее все идет в основную БД
+DB_REPLICA_URL = os.getenv("DB_REPLICA_URL")
+
+replica_engine = create_async_engine(
+    DB_REPLICA_URL,
+    echo=DB_ECHO,
+    **POOL_OPTIONS
+) if DB_REPLICA_URL else None
+
+# Только основная БД: миграции, FSM и все, что читает сразу после
+# чужой записи (реплика может отставать)
+primary_session_maker = async_sessionmaker(
     bind=engine,
     class_=AsyncSession,
     expire_on_commit=False
 )
 
+if replica_engine is None:
+    session_maker = primary_session_maker
+else:
+    session_maker = async_sessionmaker(
+        bind=engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        sync_session_class=RoutingSession,
+        replica=replica_engine,
+    )
 
-async def create_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
 
-    async with session_maker() as session:
-        await orm_create_categories(session, categories)
-        await orm_add_banner_description(session, description_for_info_pages)
+async def create_db():
+    return await migrate(engine, primary_session_maker)
 
 
 async def drop_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
+
+
+async def warm_pool(size: int | None = None):
+    """Заранее открывает соединения пула, чтобы первые апдейты их не ждали."""
+    engines = [engine] if replica_engine is None else [engine, replica_engine]
+
+    async def ping(pool_engine: AsyncEngine):
+        async with pool_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(
+        ping(pool_engine)
+        for pool_engine in engines
+        for _ in range(
+            size or getattr(pool_engine.pool, "size", lambda: 1)()
+        )
+    ))
@@ -0,0 +1,102 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey
+)
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.orm_query import (
+    orm_get_fsm_state,
+    orm_set_fsm_data,
+    orm_set_fsm_state
+)
+
+
+class SQLStorage(BaseStorage):
+    """
+    FSM-хранилище в таблице fsm_state, общее для всех процессов бота.
+
+    Каждое чтение идет в БД. Кэш (LRU с записью сквозь него) включается
+    cache_ttl > 0 и не знает о записях других процессов, поэтому годится,
+    только если апдейты одного чата всегда обрабатывает один процесс.
+    """
+
+    def __init__(
+            self,
+            session_pool: async_sessionmaker,
+            key_builder: KeyBuilder | None = None,
+            cache_size: int = 1024,
+            cache_ttl: float = 0,
+    ) -> None:
+        self.session_pool = session_pool
+        self.key_builder = key_builder or DefaultKeyBuilder()
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        # ключ -> (момент загрузки, state, data)
+        self._cache: OrderedDict[str, tuple] = OrderedDict()
+
+    async def _load(self, key: str) -> tuple[Optional[str], dict]:
+        cached = self._cache.get(key)
+        if cached and time.monotonic() - cached[0] < self.cache_ttl:
+            self._cache.move_to_end(key)
+            return cached[1], cached[2]
+        async with self.session_pool() as session:
+            record = await orm_get_fsm_state(session, key)
+        state, data = None, {}
+        if record:
+            state, data = record.state, json.loads(record.data)
+        self._remember(key, state, data)
+        return state, data
+
+    def _remember(self, key: str, state: Optional[str], data: dict) -> None:
+        if not self.cache_ttl:
+            return
+        self._cache[key] = (time.monotonic(), state, data)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def set_state(
+            self,
+            key: StorageKey,
+            state: StateType = None
+    ) -> None:
+        storage_key = self.key_builder.build(key)
+        state = state.state if isinstance(state, State) else state
+        async with self.session_pool() as session:
+            await orm_set_fsm_state(session, storage_key, state)
+        cached = self._cache.get(storage_key)
+        if cached:
+            self._remember(storage_key, state, cached[2])
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self.key_builder.build(key)
+        data = dict(data)
+        async with self.session_pool() as session:
+            await orm_set_fsm_data(
+                session,
+                storage_key,
+                json.dumps(data, ensure_ascii=False)
+            )
+        cached = self._cache.get(storage_key)
+        if cached:
+            self._remember(storage_key, cached[1], data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(self.key_builder.build(key))
+        return data.copy()
+
+    async def close(self) -> None:
+        self._cache.clear()
@@ -0,0 +1,168 @@
+"""
+Версионные миграции схемы, выполняются при старте бота.
+
+Каждая миграция - (версия, описание, async-функция от сессии).
+Примененные версии записываются в таблицу schema_version, поэтому
+на актуальной базе старт стоит одного запроса.
+Новые миграции добавляются в конец MIGRATIONS со следующим номером.
+На Postgres миграции применяются под advisory lock, поэтому реплики,
+стартующие одновременно, применяют их по очереди, а не наперегонки.
+"""
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker
+)
+
+from commands.text_for_db import categories, description_for_info_pages
+from database.models import Base, FsmState, SchemaVersion
+from database.orm_query import (
+    orm_add_banner_description,
+    orm_create_categories
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def _initial_schema(session: AsyncSession):
+    conn = await session.connection()
+    await conn.run_sync(Base.metadata.create_all)
+    await session.commit()
+    await orm_create_categories(session, categories)
+    await orm_add_banner_description(session, description_for_info_pages)
+
+
+async def _cart_unique_index(session: AsyncSession):
+    # Для баз, созданных до появления уникального индекса корзины:
+    # сливаем дубли позиций и только потом создаем индекс
+    await session.execute(text(
+        """
+        UPDATE cart SET quantity = (
+            SELECT SUM(dup.quantity) FROM cart AS dup
+            WHERE dup.user_id = cart.user_id
+            AND dup.product_id = cart.product_id
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM cart
+            GROUP BY user_id, product_id HAVING COUNT(*) > 1
+        )
+        """
+    ))
+    await session.execute(text(
+        """
+        DELETE FROM cart WHERE id NOT IN (
+            SELECT MIN(id) FROM cart GROUP BY user_id, product_id
+        )
+        """
+    ))
+    await session.execute(text(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_user_product
+        ON cart (user_id, product_id)
+        """
+    ))
+
+
+async def _hot_path_indexes(session: AsyncSession):
+    # Выборка корзины по user_id обслуживается uq_cart_user_product
+    await session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_product_category_id "
+        "ON product (category_id)"
+    ))
+    await session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_cart_product_id ON cart (product_id)"
+    ))
+
+
+async def _fsm_state_table(session: AsyncSession):
+    conn = await session.connection()
+    await conn.run_sync(FsmState.__table__.create, checkfirst=True)
+
+
+MIGRATIONS = (
+    (1, "initial schema and seed data", _initial_schema),
+    (2, "unique cart line per user and product", _cart_unique_index),
+    (3, "indexes for product and cart lookups", _hot_path_indexes),
+    (4, "persistent FSM storage", _fsm_state_table),
+)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Ключ pg_advisory_lock для миграций
+MIGRATIONS_LOCK_ID = 0x6d696772
+
+
+async def get_schema_version(engine: AsyncEngine) -> int:
+    async with engine.connect() as conn:
+        try:
+            version = await conn.scalar(
+                select(func.max(SchemaVersion.version))
+            )
+        except DBAPIError:
+            await conn.rollback()
+            if await conn.run_sync(
+                lambda sync_conn: inspect(sync_conn).has_table(
+                    SchemaVersion.__tablename__
+                )
+            ):
+                raise
+            # Таблицы версий еще нет: новая база или база до миграций
+            return 0
+    return version or 0
+
+
+@asynccontextmanager
+async def _migrations_lock(engine: AsyncEngine):
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    # Блокировка уровня соединения: миграции сами делают commit
+    async with engine.connect() as conn:
+        await conn.execute(
+            text("SELECT pg_advisory_lock(:key)"),
+            {"key": MIGRATIONS_LOCK_ID}
+        )
+        await conn.commit()
+        try:
+            yield
+        finally:
+            await conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"),
+                {"key": MIGRATIONS_LOCK_ID}
+            )
+            await conn.commit()
+
+
+async def migrate(
+        engine: AsyncEngine,
+        session_pool: async_sessionmaker
+) -> int:
+    """Применяет недостающие миграции и возвращает версию схемы."""
+    current = await get_schema_version(engine)
+    if current >= LATEST_VERSION:
+        return current
+    async with _migrations_lock(engine):
+        # Пока ждали блокировку, миграции мог применить другой процесс
+        current = await get_schema_version(engine)
+        for version, description, migration in MIGRATIONS:
+            if version <= current:
+                continue
+            started = time.perf_counter()
+            async with session_pool() as session:
+                await migration(session)
+                session.add(SchemaVersion(version=version))
+                await session.commit()
+            logger.info(
+                "Applied migration %d (%s) in %.2f s",
+                version,
+                description,
+                time.perf_counter() - started,
+            )
+            current = version
+    return current
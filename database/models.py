@@ -1,6 +1,7 @@
 from sqlalchemy import (
     DateTime,
     ForeignKey,
+    Index,
     Numeric,
     String,
     Text,
@@ -54,7 +55,8 @@ class Product(Base):
             'category.id',
             ondelete='CASCADE'
         ),
-        nullable=False
+        nullable=False,
+        index=True
     )
 
     category: Mapped['Category'] = relationship(backref='product')
@@ -72,6 +74,9 @@ class User(Base):
 
 class Cart(Base):
     __tablename__ = 'cart'
+    __table_args__ = (
+        Index('uq_cart_user_product', 'user_id', 'product_id', unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(
@@ -86,9 +91,25 @@ class Cart(Base):
             'product.id',
             ondelete='CASCADE'
         ),
-        nullable=False
+        nullable=False,
+        index=True
     )
     quantity: Mapped[int]
 
     user: Mapped['User'] = relationship(backref='cart')
     product: Mapped['Product'] = relationship(backref='cart')
+
+
+class SchemaVersion(Base):
+    __tablename__ = 'schema_version'
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    version: Mapped[int] = mapped_column(nullable=False)
+
+
+class FsmState(Base):
+    __tablename__ = 'fsm_state'
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    state: Mapped[str] = mapped_column(String(255), nullable=True)
+    data: Mapped[str] = mapped_column(Text, nullable=False, default='{}')
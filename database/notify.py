@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import uuid
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker
+)
+
+from database.models import Banner, Category, Product
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "catalog_changed"
+# Реплика не сбрасывает кэши по собственным уведомлениям:
+# после записи админ-хендлеры вызывают catalog_changed_here().
+INSTANCE_ID = uuid.uuid4().hex
+
+_subscribers = []
+
+
+def on_catalog_changed(callback):
+    """Регистрирует async-колбэк callback(session) сброса локального кэша."""
+    _subscribers.append(callback)
+    return callback
+
+
+async def publish_catalog_changed(session: AsyncSession):
+    """
+    Вызывается до commit: в Postgres уведомление уходит вместе с
+    транзакцией. Для SQLite ничего не делает, изменения ловит опрос
+    отметки updated.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        await session.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": CHANNEL, "payload": INSTANCE_ID},
+        )
+
+
+async def catalog_changed_here(session: AsyncSession):
+    """Сбрасывает локальные кэши после записи в каталог этим процессом."""
+    for callback in _subscribers:
+        await callback(session)
+
+
+async def invalidate_local_caches(session_pool: async_sessionmaker):
+    async with session_pool() as session:
+        await catalog_changed_here(session)
+
+
+class CatalogChangeListener:
+    """
+    Фоновый слушатель изменений каталога, сделанных другими репликами.
+    Postgres: LISTEN на канале CHANNEL.
+    Остальные БД: опрос max(updated) и count(*) таблиц каталога.
+    Пачка уведомлений схлопывается в один сброс кэшей.
+    """
+
+    def __init__(
+            self,
+            engine: AsyncEngine,
+            session_pool: async_sessionmaker,
+            poll_interval: float = 5,
+            retry_interval: float = 5,
+    ) -> None:
+        self.engine = engine
+        self.session_pool = session_pool
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self._changed = asyncio.Event()
+        self._tasks = []
+
+    async def start(self):
+        if self.engine.dialect.name == "postgresql":
+            source = self._listen()
+        else:
+            source = self._poll()
+        self._tasks = [
+            asyncio.create_task(source),
+            asyncio.create_task(self._invalidate_on_change()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _on_notify(self, connection, pid, channel, payload):
+        if payload != INSTANCE_ID:
+            self._changed.set()
+
+    async def _listen(self):
+        reconnect = False
+        while True:
+            try:
+                async with self.engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    driver = raw.driver_connection
+                    lost = asyncio.Event()
+                    driver.add_termination_listener(lambda _: lost.set())
+                    await driver.add_listener(CHANNEL, self._on_notify)
+                    try:
+                        if reconnect:
+                            # Пока соединения не было, уведомления терялись
+                            self._changed.set()
+                        reconnect = True
+                        await lost.wait()
+                    finally:
+                        if not driver.is_closed():
+                            await driver.remove_listener(
+                                CHANNEL,
+                                self._on_notify
+                            )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("LISTEN %s failed, reconnecting", CHANNEL)
+            await asyncio.sleep(self.retry_interval)
+
+    async def _watermark(self):
+        async with self.session_pool() as session:
+            watermark = []
+            for model in (Banner, Category, Product):
+                result = await session.execute(
+                    select(func.max(model.updated), func.count())
+                )
+                watermark.extend(result.one())
+            return tuple(watermark)
+
+    async def _poll(self):
+        watermark = None
+        while True:
+            try:
+                current = await self._watermark()
+                if watermark is not None and current != watermark:
+                    self._changed.set()
+                watermark = current
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Catalog watermark poll failed")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _invalidate_on_change(self):
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            try:
+                await invalidate_local_caches(self.session_pool)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Catalog cache invalidation failed")
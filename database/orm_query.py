@@ -1,8 +1,21 @@
-from sqlalchemy import select, update, delete
+from decimal import Decimal
+from itertools import islice
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
 
-from database.models import Banner, Cart, Category, Product, User
+from database.cache import cached, invalidate
+from database.models import (
+    Banner,
+    Cart,
+    Category,
+    FsmState,
+    Product,
+    User
+)
+from database.notify import on_catalog_changed, publish_catalog_changed
+from database.records import BannerRecord, CategoryRecord, ProductRecord
 
 
 """Работа с баннерами (информационными страницами)"""
@@ -20,7 +33,9 @@ async def orm_add_banner_description(session: AsyncSession, data: dict):
             description=description
         ) for name, description in data.items()]
     )
+    await publish_catalog_changed(session)
     await session.commit()
+    invalidate("banner")
 
 
 async def orm_change_banner_image(
@@ -30,28 +45,36 @@ async def orm_change_banner_image(
 ):
     query = update(Banner).where(Banner.name == name).values(image=image)
     await session.execute(query)
+    await publish_catalog_changed(session)
     await session.commit()
+    invalidate("banner")
+
+
+_BANNER_COLUMNS = (Banner.id, Banner.name, Banner.image, Banner.description)
 
 
+@cached("banner")
 async def orm_get_banner(session: AsyncSession, page: str):
-    query = select(Banner).where(Banner.name == page)
-    result = await session.execute(query)
-    return result.scalar()
+    query = select(*_BANNER_COLUMNS).where(Banner.name == page)
+    row = (await session.execute(query)).first()
+    return BannerRecord(*row) if row else None
 
 
+@cached("banner")
 async def orm_get_info_pages(session: AsyncSession):
-    query = select(Banner)
+    query = select(*_BANNER_COLUMNS).order_by(Banner.id)
     result = await session.execute(query)
-    return result.scalars().all()
+    return tuple(BannerRecord(*row) for row in result)
 
 
 """Категории"""
 
 
+@cached("category")
 async def orm_get_categories(session: AsyncSession):
-    query = select(Category)
+    query = select(Category.id, Category.name).order_by(Category.id)
     result = await session.execute(query)
-    return result.scalars().all()
+    return tuple(CategoryRecord(*row) for row in result)
 
 
 async def orm_create_categories(session: AsyncSession, categories: list):
@@ -60,7 +83,9 @@ async def orm_create_categories(session: AsyncSession, categories: list):
     if result.first():
         return
     session.add_all([Category(name=name) for name in categories])
+    await publish_catalog_changed(session)
     await session.commit()
+    invalidate("category")
 
 
 """Админка: добавить/изменить/удалить товар"""
@@ -75,21 +100,77 @@ async def orm_add_product(session: AsyncSession, data: dict):
         category_id=int(data["category"]),
     )
     session.add(obj)
+    await publish_catalog_changed(session)
     await session.commit()
+    invalidate("product")
 
 
-async def orm_get_all_products(session: AsyncSession, category_id):
-    query = select(Product).where(Product.category_id == int(category_id))
+_PRODUCT_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.description,
+    Product.price,
+    Product.image,
+    Product.category_id,
+)
+
+
+"""Постраничная выборка товаров"""
+
+
+@cached("product")
+async def orm_get_products_count(session: AsyncSession, category_id):
+    query = select(func.count(Product.id)).where(
+        Product.category_id == int(category_id)
+    )
     result = await session.execute(query)
-    return result.scalars().all()
+    return result.scalar()
 
 
-async def orm_get_product(session: AsyncSession, product_id: int):
-    query = select(Product).where(Product.id == product_id)
+@on_catalog_changed
+async def _reset_caches(session: AsyncSession):
+    # Каталог изменил другой процесс
+    invalidate("banner", "category", "product")
+
+
+async def orm_get_products_window(
+        session: AsyncSession,
+        category_id,
+        offset: int,
+        limit: int = 1
+):
+    query = select(Product).where(
+        Product.category_id == int(category_id)
+    ).order_by(Product.id).offset(offset).limit(limit)
     result = await session.execute(query)
+    return result.scalars().all()
+
+
+async def orm_get_adjacent_product(
+        session: AsyncSession,
+        category_id,
+        product_id: int,
+        forward: bool = True
+):
+    """Keyset-выборка соседнего товара: не зависит от размера категории."""
+    query = select(Product).where(Product.category_id == int(category_id))
+    if forward:
+        query = query.where(Product.id > product_id).order_by(Product.id)
+    else:
+        query = query.where(
+            Product.id < product_id
+        ).order_by(Product.id.desc())
+    result = await session.execute(query.limit(1))
     return result.scalar()
 
 
+@cached("product", maxsize=4096)
+async def orm_get_product(session: AsyncSession, product_id: int):
+    query = select(*_PRODUCT_COLUMNS).where(Product.id == product_id)
+    row = (await session.execute(query)).first()
+    return ProductRecord(*row) if row else None
+
+
 async def orm_update_product(session: AsyncSession, product_id: int, data):
     query = (
         update(Product)
@@ -103,68 +184,154 @@ async def orm_update_product(session: AsyncSession, product_id: int, data):
         )
     )
     await session.execute(query)
+    await publish_catalog_changed(session)
     await session.commit()
+    invalidate("product")
 
 
 async def orm_delete_product(session: AsyncSession, product_id: int):
     query = delete(Product).where(Product.id == product_id)
     await session.execute(query)
+    await publish_catalog_changed(session)
+    await session.commit()
+    invalidate("product")
+
+
+async def orm_upsert_products(
+        session: AsyncSession,
+        products,
+        batch_size: int = 500
+) -> dict:
+    """
+    Массовое добавление/изменение товаров одной транзакцией.
+    products - итерируемое словарей как в orm_add_product, товары
+    с ключом id обновляются, без него - добавляются. Читается пачками
+    по batch_size, поэтому products может быть генератором.
+    Возвращает число добавленных и измененных товаров и id, которых
+    нет в базе.
+    """
+    result = {"inserted": 0, "updated": 0, "missing": []}
+    products = iter(products)
+    while batch := list(islice(products, batch_size)):
+        rows = [
+            {
+                "name": data["name"],
+                "description": data["description"],
+                "price": Decimal(str(data["price"])),
+                "image": data["image"],
+                "category_id": int(data["category"]),
+                **({"id": int(data["id"])} if data.get("id") else {}),
+            }
+            for data in batch
+        ]
+        ids = [row["id"] for row in rows if "id" in row]
+        existing = set()
+        if ids:
+            existing = set((await session.scalars(
+                select(Product.id).where(Product.id.in_(ids))
+            )).all())
+        new_rows = [row for row in rows if "id" not in row]
+        changed_rows = [row for row in rows if row.get("id") in existing]
+        result["missing"].extend(
+            row["id"] for row in rows
+            if "id" in row and row["id"] not in existing
+        )
+        if new_rows:
+            await session.execute(insert(Product), new_rows)
+        if changed_rows:
+            # UPDATE по первичному ключу пачкой (executemany)
+            await session.execute(update(Product), changed_rows)
+        result["inserted"] += len(new_rows)
+        result["updated"] += len(changed_rows)
+    await publish_catalog_changed(session)
     await session.commit()
+    invalidate("product")
+    return result
+
+
+async def orm_iter_products(session: AsyncSession, batch_size: int = 1000):
+    """Все товары по порядку id пачками, без загрузки каталога в память."""
+    query = select(
+        Product.id,
+        Product.name,
+        Product.description,
+        Product.price,
+        Product.image,
+        Product.category_id,
+    ).order_by(Product.id).execution_options(yield_per=batch_size)
+    result = await session.stream(query)
+    async for batch in result.partitions():
+        yield batch
 
 
 """Добавляем юзера в БД """
 
 
-async def orm_add_user(
-    session: AsyncSession,
-    user_id: int,
-    first_name: str | None = None,
-    last_name: str | None = None,
-    phone: str | None = None,
-):
-    query = select(User).where(User.user_id == user_id)
-    result = await session.execute(query)
-    if result.first() is None:
-        session.add(
-            User(
-                user_id=user_id,
-                first_name=first_name,
-                last_name=last_name,
-                phone=phone
-            )
-        )
-        await session.commit()
+async def orm_add_users(session: AsyncSession, users: list[dict]):
+    """Добавляет пользователей пачкой, уже существующих пропускает."""
+    if not users:
+        return
+    query = _insert(session, User).values(users).on_conflict_do_nothing(
+        index_elements=[User.user_id]
+    )
+    await session.execute(query)
+    await session.commit()
 
 
 """Работа с корзиной"""
 
 
+def _insert(session: AsyncSession, model):
+    """INSERT с поддержкой ON CONFLICT для диалекта текущего движка."""
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
 async def orm_add_to_cart(
         session: AsyncSession,
         user_id: int,
-        product_id: int
+        product_id: int,
+        quantity: int = 1
 ):
-    query = select(Cart).where(
-        Cart.user_id == user_id,
-        Cart.product_id == product_id
-    ).options(joinedload(Cart.product))
-    cart = await session.execute(query)
-    cart = cart.scalar()
-    if cart:
-        cart.quantity += 1
-        await session.commit()
-        return cart
-    else:
-        session.add(Cart(user_id=user_id, product_id=product_id, quantity=1))
-        await session.commit()
+    query = _insert(session, Cart).values(
+        user_id=user_id,
+        product_id=product_id,
+        quantity=quantity
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[Cart.user_id, Cart.product_id],
+        set_={"quantity": Cart.quantity + quantity, "updated": func.now()},
+    ).returning(Cart.quantity)
+    result = await session.execute(query)
+    await session.commit()
+    return result.scalar()
 
 
-async def orm_get_user_carts(session: AsyncSession, user_id):
-    query = select(Cart).filter(
+async def orm_get_user_cart_page(
+        session: AsyncSession,
+        user_id: int,
+        page: int = 1
+):
+    """
+    Одна позиция корзины вместе с числом позиций и общей суммой,
+    посчитанными в БД оконными функциями за один запрос.
+    """
+    query = select(
+        Cart.quantity,
+        Product.id.label("product_id"),
+        Product.name,
+        Product.price,
+        Product.image,
+        func.count().over().label("lines"),
+        func.sum(Cart.quantity * Product.price).over().label("total_price"),
+    ).join(
+        Product, Cart.product_id == Product.id
+    ).where(
         Cart.user_id == user_id
-    ).options(joinedload(Cart.product))
+    ).order_by(Cart.id).offset(page - 1).limit(1)
     result = await session.execute(query)
-    return result.scalars().all()
+    return result.first()
 
 
 async def orm_delete_from_cart(
@@ -183,21 +350,71 @@ async def orm_delete_from_cart(
 async def orm_reduce_product_in_cart(
         session: AsyncSession,
         user_id: int,
-        product_id: int
+        product_id: int,
+        quantity: int = 1
 ):
-    query = select(Cart).where(
-        Cart.user_id == user_id, Cart.product_id == product_id
-    ).options(joinedload(Cart.product))
-    cart = await session.execute(query)
-    cart = cart.scalar()
+    in_cart = (Cart.user_id == user_id, Cart.product_id == product_id)
+    while True:
+        query = update(Cart).where(
+            *in_cart,
+            Cart.quantity > quantity
+        ).values(quantity=Cart.quantity - quantity).returning(Cart.quantity)
+        result = await session.execute(
+            query,
+            execution_options={"synchronize_session": False}
+        )
+        if result.scalar() is not None:
+            await session.commit()
+            return True
+
+        # Строку, выросшую после UPDATE параллельным "+1", не удаляем
+        query = delete(Cart).where(
+            *in_cart,
+            Cart.quantity <= quantity
+        ).returning(Cart.id)
+        result = await session.execute(
+            query,
+            execution_options={"synchronize_session": False}
+        )
+        if result.scalar() is not None:
+            await session.commit()
+            return False
 
-    if not cart:
-        return
-    if cart.quantity > 1:
-        cart.quantity -= 1
-        await session.commit()
-        return True
-    else:
-        await orm_delete_from_cart(session, user_id, product_id)
-        await session.commit()
-        return False
+        result = await session.execute(select(Cart.id).where(*in_cart))
+        if result.scalar() is None:
+            await session.commit()
+            return None
+        # Количество успело измениться между запросами - повторяем
+
+
+"""Состояния FSM"""
+
+
+async def orm_get_fsm_state(session: AsyncSession, key: str):
+    query = select(FsmState.state, FsmState.data).where(FsmState.key == key)
+    result = await session.execute(query)
+    return result.first()
+
+
+async def _save_fsm_column(session: AsyncSession, key: str, **values):
+    query = _insert(session, FsmState).values(key=key, **values)
+    query = query.on_conflict_do_update(
+        index_elements=[FsmState.key],
+        set_={**values, "updated": func.now()},
+    )
+    await session.execute(query)
+    # Пустые записи (после state.clear()) не храним
+    await session.execute(delete(FsmState).where(
+        FsmState.key == key,
+        FsmState.state.is_(None),
+        FsmState.data == "{}"
+    ))
+    await session.commit()
+
+
+async def orm_set_fsm_state(session: AsyncSession, key: str, state):
+    await _save_fsm_column(session, key, state=state)
+
+
+async def orm_set_fsm_data(session: AsyncSession, key: str, data: str):
+    await _save_fsm_column(session, key, data=data)
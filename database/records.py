@@ -0,0 +1,38 @@
+"""Компактные неизменяемые записи каталога, не привязанные к сессии."""
+
+
+class BannerRecord:
+    __slots__ = ("id", "name", "image", "description")
+
+    def __init__(self, id, name, image, description):
+        self.id = id
+        self.name = name
+        self.image = image
+        self.description = description
+
+
+class CategoryRecord:
+    __slots__ = ("id", "name")
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+
+class ProductRecord:
+    __slots__ = (
+        "id",
+        "name",
+        "description",
+        "price",
+        "image",
+        "category_id",
+    )
+
+    def __init__(self, id, name, description, price, image, category_id):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.price = price
+        self.image = image
+        self.category_id = category_id
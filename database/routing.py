@@ -0,0 +1,48 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+# Внутри primary_reads() RoutingSession читает из основной БД
+_primary_reads = ContextVar("primary_reads", default=False)
+
+
+@contextmanager
+def primary_reads():
+    """
+    Чтение для кэшей: значение, прочитанное с отстающей реплики
+    сразу после сброса кэша, прожило бы в кэше весь его ttl.
+    """
+    token = _primary_reads.set(True)
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+class RoutingSession(Session):
+    """
+    Отправляет SELECT на реплику, а запись, SELECT ... FOR UPDATE и
+    прочие запросы - в основную БД, как и чтение внутри primary_reads().
+    После первой записи сессия читает только из основной БД, чтобы
+    видеть свои изменения, которые еще не доехали до реплики. Признак
+    хранится в info и переживает commit() и close().
+    """
+
+    def __init__(self, *args, replica: AsyncEngine, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.replica = replica
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        is_read = (
+            not self._flushing
+            and clause is not None
+            and clause.is_select
+            and getattr(clause, "_for_update_arg", None) is None
+        )
+        if not is_read:
+            self.info["primary"] = True
+        elif not self.info.get("primary") and not _primary_reads.get():
+            return self.replica.sync_engine
+        return super().get_bind(mapper, clause=clause, **kwargs)
@@ -0,0 +1,191 @@
+"""
+Генерация большого синтетического каталога для нагрузочных тестов.
+
+    python -m database.seed --categories 100 --products 100000 \\
+        --users 10000 --cart-lines 1000000
+
+Строки вставляются пачками: в Postgres через COPY (asyncpg),
+в остальных БД - многострочными INSERT.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from itertools import islice
+
+from sqlalchemy import Table, insert, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from database.engine import create_db, engine, session_maker
+from database.models import Cart, Category, Product, User
+from database.notify import publish_catalog_changed
+
+# Синтетические telegram id не пересекаются с настоящими
+USER_ID_START = 10 ** 12
+
+
+def _batches(rows, size: int):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+async def bulk_insert(
+        conn: AsyncConnection,
+        table: Table,
+        columns: tuple[str, ...],
+        rows,
+        batch_size: int = 5000
+) -> int:
+    """Вставляет кортежи rows в колонки columns, возвращает их число."""
+    inserted = 0
+    if conn.dialect.name == "postgresql":
+        raw = await conn.get_raw_connection()
+        for batch in _batches(rows, batch_size):
+            await raw.driver_connection.copy_records_to_table(
+                table.name,
+                records=batch,
+                columns=columns
+            )
+            inserted += len(batch)
+    else:
+        statement = insert(table)
+        for batch in _batches(rows, batch_size):
+            await conn.execute(
+                statement,
+                [dict(zip(columns, row)) for row in batch]
+            )
+            inserted += len(batch)
+    return inserted
+
+
+async def seed(
+        engine: AsyncEngine = engine,
+        *,
+        categories: int = 0,
+        products: int = 0,
+        users: int = 0,
+        cart_lines: int = 0,
+        batch_size: int = 5000,
+        rng: random.Random | None = None
+) -> dict[str, int]:
+    """
+    Товары распределяются поровну по всем категориям, позиции корзины -
+    поровну между новыми пользователями, без повторов товара
+    у одного пользователя.
+    """
+    rng = rng or random.Random()
+    # Наивное UTC, как func.now() в SQLite (CURRENT_TIMESTAMP): иначе
+    # на хосте не в UTC строки окажутся "в будущем", и опрос изменений
+    # каталога по max(updated) пропустит последующие правки
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    counts = {}
+    async with engine.begin() as conn:
+        counts["categories"] = await bulk_insert(
+            conn,
+            Category.__table__,
+            ("name", "created", "updated"),
+            ((f"Категория {index}", now, now) for index in range(categories)),
+            batch_size
+        )
+        category_ids = (await conn.scalars(select(Category.id))).all()
+
+        counts["products"] = await bulk_insert(
+            conn,
+            Product.__table__,
+            (
+                "name", "description", "price", "image", "category_id",
+                "created", "updated",
+            ),
+            (
+                (
+                    f"Товар {index}",
+                    f"Описание товара {index}",
+                    Decimal(rng.randint(100, 100000)) / 100,
+                    f"photo-{index}",
+                    category_ids[index % len(category_ids)],
+                    now,
+                    now,
+                )
+                for index in range(products)
+            ),
+            batch_size
+        )
+
+        user_id_start = max(
+            USER_ID_START,
+            (await conn.scalar(select(User.user_id).order_by(
+                User.user_id.desc()
+            ).limit(1)) or 0) + 1
+        )
+        user_ids = range(user_id_start, user_id_start + users)
+        counts["users"] = await bulk_insert(
+            conn,
+            User.__table__,
+            ("user_id", "first_name", "created", "updated"),
+            ((user_id, "Shopper", now, now) for user_id in user_ids),
+            batch_size
+        )
+
+        counts["cart_lines"] = 0
+        if users and cart_lines:
+            product_ids = (await conn.scalars(select(Product.id))).all()
+            per_user = min(cart_lines // users, len(product_ids))
+
+            def cart_rows():
+                for user_id in user_ids:
+                    for product_id in rng.sample(product_ids, per_user):
+                        yield (
+                            user_id,
+                            product_id,
+                            rng.randint(1, 5),
+                            now,
+                            now,
+                        )
+
+            counts["cart_lines"] = await bulk_insert(
+                conn,
+                Cart.__table__,
+                ("user_id", "product_id", "quantity", "created", "updated"),
+                cart_rows(),
+                batch_size
+            )
+    return counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seed a synthetic catalog")
+    parser.add_argument("--categories", type=int, default=0)
+    parser.add_argument("--products", type=int, default=0)
+    parser.add_argument("--users", type=int, default=0)
+    parser.add_argument("--cart-lines", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    await create_db()
+    started = time.perf_counter()
+    counts = await seed(
+        engine,
+        categories=args.categories,
+        products=args.products,
+        users=args.users,
+        cart_lines=args.cart_lines,
+        batch_size=args.batch_size,
+        rng=random.Random(args.seed),
+    )
+    # Запущенные реплики должны перечитать каталог
+    async with session_maker() as session:
+        await publish_catalog_changed(session)
+        await session.commit()
+    print(", ".join(f"{name}: {count}" for name, count in counts.items()))
+    print(f"done in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
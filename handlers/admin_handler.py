@@ -1,11 +1,25 @@
+import csv
+import io
+import math
+import os
+import tempfile
+
 from aiogram import F, Router
-from aiogram.types import CallbackQuery, Message, ReplyKeyboardRemove
-from aiogram.filters import Command, StateFilter, or_f
+from aiogram.types import (
+    CallbackQuery,
+    FSInputFile,
+    InputMediaPhoto,
+    Message,
+    ReplyKeyboardRemove
+)
+from aiogram.filters import Command, CommandObject, StateFilter, or_f
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from database.notify import catalog_changed_here
 from database.orm_query import (
     orm_change_banner_image,
     orm_get_categories,
@@ -13,15 +27,34 @@ from database.orm_query import (
     orm_delete_product,
     orm_get_info_pages,
     orm_get_product,
-    orm_get_all_products,
+    orm_get_products_count,
+    orm_get_products_window,
     orm_update_product,
+    orm_upsert_products,
 )
 
 from filters.chat_type import ChatTypeFilter, AdminFilter
 
-from keyboards.inline import get_callback_button
+from keyboards.inline import (
+    get_admin_products_buttons,
+    get_callback_button
+)
 from keyboards.reply import get_reply_keyboard
 
+from utils.flood_control import bulk_priority
+from utils.paginator import Paginator
+from utils.product_io import (
+    FIELDS,
+    FORMATS,
+    export_products,
+    parse_products
+)
+from utils.validators import (
+    validate_description,
+    validate_name,
+    validate_price
+)
+
 
 router = Router()
 router.message.filter(ChatTypeFilter(["private"]), AdminFilter())
@@ -53,27 +86,90 @@ async def admin_features2(message: Message, session: AsyncSession):
     )
 
 
+# Альбом в Telegram вмещает не больше 10 фото
+ADMIN_PAGE_SIZE = 10
+
+
+def product_caption(number: int, product) -> str:
+    return (
+        f"{number}. <strong>{product.name}"
+        f"</strong>\n{product.description}\n"
+        f"Стоимость: {round(product.price, 2)}"
+    )
+
+
+async def send_products_page(
+        message: Message,
+        session: AsyncSession,
+        category_id: int,
+        page: int
+):
+    total = await orm_get_products_count(session, category_id)
+    pages = max(math.ceil(total / ADMIN_PAGE_SIZE), 1)
+    # После удаления товаров страница могла исчезнуть
+    page = min(max(page, 1), pages)
+    window = await orm_get_products_window(
+        session,
+        category_id,
+        (page - 1) * ADMIN_PAGE_SIZE,
+        ADMIN_PAGE_SIZE
+    )
+    await session.close()
+    products = Paginator(
+        window,
+        page=page,
+        per_page=ADMIN_PAGE_SIZE,
+        total=total
+    ).get_page()
+    if not products:
+        await message.answer("В этой категории нет товаров")
+        return
+
+    # Выдача ассортимента не должна задерживать ответы покупателям
+    with bulk_priority():
+        if len(products) == 1:
+            await message.answer_photo(
+                products[0].image,
+                caption=product_caption(1, products[0])
+            )
+        else:
+            await message.answer_media_group([
+                InputMediaPhoto(
+                    media=product.image,
+                    caption=product_caption(number, product)
+                )
+                for number, product in enumerate(products, start=1)
+            ])
+        await message.answer(
+            f"Товары {(page - 1) * ADMIN_PAGE_SIZE + 1}-"
+            f"{(page - 1) * ADMIN_PAGE_SIZE + len(products)} из {total}, "
+            f"страница {page} из {pages} ⏫",
+            reply_markup=get_admin_products_buttons(
+                category=category_id,
+                page=page,
+                product_ids=[product.id for product in products],
+                pages=pages
+            )
+        )
+
+
 @router.callback_query(F.data.startswith('category_'))
 async def starring_at_product(callback: CallbackQuery, session: AsyncSession):
     category_id = callback.data.split('_')[-1]
-    for product in await orm_get_all_products(session, int(category_id)):
-        await callback.message.answer_photo(
-            product.image,
-            caption=(
-                f"<strong>{product.name}"
-                f"</strong>\n{product.description}\n"
-                f"Стоимость: {round(product.price, 2)}"
-            ),
-            reply_markup=get_callback_button(
-                button={
-                    "Удалить": f"delete_{product.id}",
-                    "Изменить": f"change_{product.id}",
-                },
-                sizes=(2,)
-            ),
-        )
     await callback.answer()
-    await callback.message.answer("ОК, вот список товаров ⏫")
+    await send_products_page(callback.message, session, int(category_id), 1)
+
+
+@router.callback_query(F.data.startswith('products_'))
+async def products_page(callback: CallbackQuery, session: AsyncSession):
+    _, category_id, page = callback.data.split('_')
+    await callback.answer()
+    await send_products_page(
+        callback.message,
+        session,
+        int(category_id),
+        int(page)
+    )
 
 
 @router.callback_query(F.data.startswith("delete_"))
@@ -83,6 +179,7 @@ async def delete_product_callback(
 ):
     product_id = callback.data.split("_")[-1]
     await orm_delete_product(session, int(product_id))
+    await catalog_changed_here(session)
 
     await callback.answer("Товар удален")
     await callback.message.answer("Товар удален!")
@@ -123,6 +220,7 @@ async def add_banner(
         )
         return
     await orm_change_banner_image(session, for_page, image_id,)
+    await catalog_changed_here(session)
     await message.answer("Баннер добавлен/изменен.")
     await state.clear()
 
@@ -140,8 +238,6 @@ class AddProduct(StatesGroup):
     price = State()
     image = State()
 
-    product_for_change = None
-
     texts = {
         "AddProduct:name": "Введите название заново:",
         "AddProduct:description": "Введите описание заново:",
@@ -154,13 +250,13 @@ class AddProduct(StatesGroup):
 # Становимся в состояние ожидания ввода name
 @router.callback_query(StateFilter(None), F.data.startswith("change_"))
 async def change_product_callback(
-    callback: CallbackQuery, state: FSMContext, session: AsyncSession
+    callback: CallbackQuery, state: FSMContext
 ):
     product_id = callback.data.split("_")[-1]
 
-    product_for_change = await orm_get_product(session, int(product_id))
-
-    AddProduct.product_for_change = product_for_change
+    # id товара хранится в данных FSM своего чата,
+    # поэтому админы не мешают друг другу
+    await state.update_data(product_for_change=int(product_id))
 
     await callback.answer()
     await callback.message.answer(
@@ -184,8 +280,6 @@ async def cancel_handler(message: Message, state: FSMContext) -> None:
     current_state = await state.get_state()
     if current_state is None:
         return
-    if AddProduct.product_for_change:
-        AddProduct.product_for_change = None
     await state.clear()
     await message.answer("Действия отменены", reply_markup=ADMIN_KB)
 
@@ -215,16 +309,27 @@ async def back_step_handler(message: Message, state: FSMContext) -> None:
         previous = step
 
 
+async def get_product_for_change(state: FSMContext, session: AsyncSession):
+    """Изменяемый товар или None, если товар добавляется."""
+    product_id = await state.get_value("product_for_change")
+    if product_id is None:
+        return None
+    return await orm_get_product(session, product_id)
+
+
 @router.message(AddProduct.name, F.text)
-async def add_name(message: Message, state: FSMContext):
-    if message.text == "." and AddProduct.product_for_change:
-        await state.update_data(name=AddProduct.product_for_change.name)
+async def add_name(
+        message: Message,
+        state: FSMContext,
+        session: AsyncSession
+):
+    if message.text == "." and (
+        product_for_change := await get_product_for_change(state, session)
+    ):
+        await state.update_data(name=product_for_change.name)
     else:
-        if 4 >= len(message.text) >= 150:
-            await message.answer(
-                "Название товара не должно превышать 150 символов "
-                "или быть менее 5ти символов. \n Введите заново"
-            )
+        if error := validate_name(message.text):
+            await message.answer(f"{error}. \n Введите заново")
             return
 
         await state.update_data(name=message.text)
@@ -244,15 +349,15 @@ async def add_description(
         message: Message,
         state: FSMContext,
         session: AsyncSession):
-    if message.text == "." and AddProduct.product_for_change:
+    if message.text == "." and (
+        product_for_change := await get_product_for_change(state, session)
+    ):
         await state.update_data(
-            description=AddProduct.product_for_change.description
+            description=product_for_change.description
         )
     else:
-        if 4 >= len(message.text):
-            await message.answer(
-                "Слишком короткое описание. \n Введите заново"
-            )
+        if error := validate_description(message.text):
+            await message.answer(f"{error}. \n Введите заново")
             return
         await state.update_data(description=message.text)
 
@@ -295,14 +400,18 @@ async def category_choice2(message: Message, state: FSMContext):
 
 
 @router.message(AddProduct.price, F.text)
-async def add_price(message: Message, state: FSMContext):
-    if message.text == "." and AddProduct.product_for_change:
-        await state.update_data(price=AddProduct.product_for_change.price)
+async def add_price(
+        message: Message,
+        state: FSMContext,
+        session: AsyncSession
+):
+    if message.text == "." and (
+        product_for_change := await get_product_for_change(state, session)
+    ):
+        await state.update_data(price=str(product_for_change.price))
     else:
-        try:
-            float(message.text)
-        except ValueError:
-            await message.answer("Введите корректное значение цены")
+        if error := validate_price(message.text):
+            await message.answer(error)
             return
 
         await state.update_data(price=message.text)
@@ -323,8 +432,10 @@ async def add_image(
         state: FSMContext,
         session: AsyncSession
 ):
-    if message.text and message.text == "." and AddProduct.product_for_change:
-        await state.update_data(image=AddProduct.product_for_change.image)
+    if message.text and message.text == "." and (
+        product_for_change := await get_product_for_change(state, session)
+    ):
+        await state.update_data(image=product_for_change.image)
 
     elif message.photo:
         await state.update_data(image=message.photo[-1].file_id)
@@ -333,14 +444,15 @@ async def add_image(
         return
     data = await state.get_data()
     try:
-        if AddProduct.product_for_change:
+        if data.get("product_for_change"):
             await orm_update_product(
                 session,
-                AddProduct.product_for_change.id,
+                data["product_for_change"],
                 data
             )
         else:
             await orm_add_product(session, data)
+        await catalog_changed_here(session)
         await message.answer(
             "Товар добавлен/изменен",
             reply_markup=ADMIN_KB
@@ -355,9 +467,115 @@ async def add_image(
         )
         await state.clear()
 
-    AddProduct.product_for_change = None
-
 
 @router.message(AddProduct.image)
 async def add_image3(message: Message, state: FSMContext):
     await message.answer("Отправьте фото товара")
+
+
+class ImportProducts(StatesGroup):
+    file = State()
+
+
+# Сколько ошибок импорта показывать в ответе
+IMPORT_ERRORS_SHOWN = 20
+
+
+@router.message(StateFilter(None), Command("import"))
+async def import_products(message: Message, state: FSMContext):
+    await message.answer(
+        "Отправьте файл .csv или .json с товарами.\n"
+        f"Колонки: {', '.join(FIELDS)}. Товары без id будут добавлены, "
+        "с id - изменены.",
+        reply_markup=ReplyKeyboardRemove()
+    )
+    await state.set_state(ImportProducts.file)
+
+
+@router.message(ImportProducts.file, F.document)
+async def import_products_file(
+        message: Message,
+        state: FSMContext,
+        session: AsyncSession
+):
+    file_format = (message.document.file_name or "").rsplit(".", 1)[-1]
+    file_format = file_format.lower()
+    if file_format not in FORMATS:
+        await message.answer("Поддерживаются только файлы .csv и .json")
+        return
+
+    errors = []
+    with tempfile.TemporaryFile() as raw:
+        await message.bot.download(message.document, destination=raw)
+        category_ids = {
+            category.id for category in await orm_get_categories(session)
+        }
+        file = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        try:
+            result = await orm_upsert_products(
+                session,
+                parse_products(file, file_format, category_ids, errors)
+            )
+        except (ValueError, csv.Error) as e:
+            # json.JSONDecodeError и UnicodeDecodeError - тоже ValueError
+            await session.rollback()
+            await message.answer(
+                f"Файл не прочитан, ничего не изменено: \n{str(e)}",
+                reply_markup=ADMIN_KB
+            )
+            await state.clear()
+            return
+        except SQLAlchemyError as e:
+            await session.rollback()
+            await message.answer(
+                "База данных отклонила импорт, ничего не изменено: "
+                f"\n{getattr(e, 'orig', None) or e}",
+                reply_markup=ADMIN_KB
+            )
+            await state.clear()
+            return
+    await catalog_changed_here(session)
+    await session.close()
+
+    errors.extend(
+        (None, f"нет товара с id {product_id}")
+        for product_id in result["missing"]
+    )
+    report = [
+        f"Добавлено: {result['inserted']}, изменено: {result['updated']}, "
+        f"ошибок: {len(errors)}"
+    ]
+    report.extend(
+        f"{'строка ' + str(number) if number else 'файл'}: {error}"
+        for number, error in errors[:IMPORT_ERRORS_SHOWN]
+    )
+    if len(errors) > IMPORT_ERRORS_SHOWN:
+        report.append(f"и еще {len(errors) - IMPORT_ERRORS_SHOWN}")
+    await message.answer("\n".join(report), reply_markup=ADMIN_KB)
+    await state.clear()
+
+
+@router.message(ImportProducts.file)
+async def import_products_file2(message: Message, state: FSMContext):
+    await message.answer("Отправьте файл .csv или .json или отмена")
+
+
+@router.message(Command("export"))
+async def export_products_file(
+        message: Message,
+        session: AsyncSession,
+        command: CommandObject
+):
+    file_format = (command.args or "csv").strip().lower()
+    if file_format not in FORMATS:
+        await message.answer("Формат выгрузки: /export csv или /export json")
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"products.{file_format}")
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            written = await export_products(session, file, file_format)
+        await session.close()
+        await message.answer_document(
+            FSInputFile(path),
+            caption=f"Товаров: {written}"
+        )
@@ -2,13 +2,14 @@ from aiogram import types, Router
 from aiogram.filters import CommandStart
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from database.orm_query import (
-    orm_add_to_cart,
-    orm_add_user,
-)
+from database.orm_query import orm_add_to_cart
 
 from filters.chat_type import ChatTypeFilter
+from utils.card_prefetch import card_prefetch
+from utils.cart_taps import cart_taps
 from utils.menu_processing import get_menu_content
+from utils.rendered_views import rendered_views
+from utils.user_registry import user_registry
 from keyboards.inline import MenuCallBack
 
 
@@ -18,17 +19,20 @@ router.message.filter(ChatTypeFilter(["private"]))
 
 @router.message(CommandStart())
 async def start_cmd(message: types.Message, session: AsyncSession):
+    user_registry.remember(message.from_user)
     media, reply_markup = await get_menu_content(
         session,
         level=0,
         menu_name="main"
     )
+    await session.close()
 
-    await message.answer_photo(
+    sent = await message.answer_photo(
         media.media,
         caption=media.caption,
         reply_markup=reply_markup
     )
+    rendered_views.remember(sent, media, reply_markup)
 
 
 async def add_to_cart(
@@ -37,18 +41,14 @@ async def add_to_cart(
         session: AsyncSession
 ):
     user = callback.from_user
-    await orm_add_user(
-        session,
-        user_id=user.id,
-        first_name=user.first_name,
-        last_name=user.last_name,
-        phone=None,
-    )
+    # Пользователь должен быть в БД раньше своей корзины
+    await user_registry.ensure(session, user)
     await orm_add_to_cart(
         session,
         user_id=user.id,
         product_id=callback_data.product_id
     )
+    await session.close()
     await callback.answer("Товар добавлен в корзину.")
 
 
@@ -59,19 +59,37 @@ async def user_menu(
         session: AsyncSession
 ):
 
+    if (callback_data.menu_name in ("increment", "decrement")
+            and cart_taps.window):
+        # Серия нажатий +1/-1 применяется одним изменением
+        cart_taps.tap(callback, callback_data)
+        await callback.answer()
+        return
+    await cart_taps.flush_user(callback.from_user.id)
+
     if callback_data.menu_name == "add_to_cart":
         await add_to_cart(callback, callback_data, session)
         return
 
-    media, reply_markup = await get_menu_content(
-        session,
-        level=callback_data.level,
-        menu_name=callback_data.menu_name,
-        category=callback_data.category,
-        page=callback_data.page,
-        product_id=callback_data.product_id,
-        user_id=callback.from_user.id,
-    )
+    # Соседние карточки товаров рисуются заранее, см. card_prefetch
+    prefetched = None
+    if callback_data.level == 2:
+        prefetched = card_prefetch.get(callback.from_user.id, callback.data)
+    if prefetched:
+        media, reply_markup = prefetched
+    else:
+        media, reply_markup = await get_menu_content(
+            session,
+            level=callback_data.level,
+            menu_name=callback_data.menu_name,
+            category=callback_data.category,
+            page=callback_data.page,
+            product_id=callback_data.product_id,
+            user_id=callback.from_user.id,
+        )
+        await session.close()
 
-    await callback.message.edit_media(media=media, reply_markup=reply_markup)
+    await rendered_views.edit(callback.message, media, reply_markup)
     await callback.answer()
+    if callback_data.level == 2:
+        card_prefetch.schedule(callback.from_user.id, reply_markup)
@@ -1,16 +1,17 @@
-from aiogram.filters.callback_data import CallbackData
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from database.notify import on_catalog_changed
+from keyboards.menu_callback import MenuCallBack, MenuName
 
-class MenuCallBack(CallbackData, prefix='menu'):
-    level: int
-    menu_name: str
-    category: int | None = None
-    page: int = 1
-    product_id: int | None = None
+# Клавиатуры меню зависят только от нескольких чисел,
+# поэтому готовая разметка переиспользуется между нажатиями
+KEYBOARD_CACHE_SIZE = 1024
 
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_user_main_button(*, level, sizes: tuple[int] = (2,)):
     keyboard = InlineKeyboardBuilder()
 
@@ -53,7 +54,19 @@ def get_user_catalog_buttons(
         categories: list,
         sizes: tuple[int] = (2,)
 ):
+    return _get_user_catalog_buttons(
+        level,
+        tuple((category.id, category.name) for category in categories),
+        sizes
+    )
+
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _get_user_catalog_buttons(
+        level: int,
+        categories: tuple[tuple[int, str], ...],
+        sizes: tuple[int]
+):
     keyboard = InlineKeyboardBuilder()
 
     keyboard.add(InlineKeyboardButton(
@@ -69,17 +82,22 @@ def get_user_catalog_buttons(
             menu_name='cart'
         ).pack()))
 
-    for category in categories:
+    for category_id, name in categories:
         keyboard.add(InlineKeyboardButton(
-            text=category.name,
+            text=name,
             callback_data=MenuCallBack(
                 level=level+1,
-                menu_name=category.name,
-                category=category.id
+                menu_name=MenuName.products,
+                category=category_id
             ).pack()))
     return keyboard.adjust(*sizes).as_markup()
 
 
+@on_catalog_changed
+async def _clear_catalog_buttons(session):
+    _get_user_catalog_buttons.cache_clear()
+
+
 def get_products_buttons(
         *,
         level: int,
@@ -88,6 +106,25 @@ def get_products_buttons(
         pagination_buttons: dict,
         product_id: int,
         sizes: tuple[int] = (2, 1)
+):
+    return _get_products_buttons(
+        level,
+        category,
+        page,
+        tuple(pagination_buttons.items()),
+        product_id,
+        sizes
+    )
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _get_products_buttons(
+        level: int,
+        category: int,
+        page: int,
+        pagination_buttons: tuple[tuple[str, str], ...],
+        product_id: int,
+        sizes: tuple[int]
 ):
     keyboard = InlineKeyboardBuilder()
 
@@ -114,7 +151,7 @@ def get_products_buttons(
     keyboard.adjust(*sizes)
 
     row = []
-    for text, menu_name in pagination_buttons.items():
+    for text, menu_name in pagination_buttons:
         if menu_name == 'next':
             row.append(InlineKeyboardButton(
                 text=text,
@@ -123,6 +160,7 @@ def get_products_buttons(
                     menu_name=menu_name,
                     category=category,
                     page=page + 1,
+                    product_id=product_id,
                 ).pack()))
         elif menu_name == 'previous':
             row.append(InlineKeyboardButton(
@@ -132,6 +170,7 @@ def get_products_buttons(
                     menu_name=menu_name,
                     category=category,
                     page=page - 1,
+                    product_id=product_id,
                 ).pack()))
     return keyboard.row(*row).as_markup()
 
@@ -143,6 +182,23 @@ def get_user_cart_buttons(
         pagination_buttons: dict | None,
         product_id: int | None,
         sizes: tuple[int] = (3,)
+):
+    return _get_user_cart_buttons(
+        level,
+        page,
+        tuple(pagination_buttons.items()) if pagination_buttons else (),
+        product_id,
+        sizes
+    )
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _get_user_cart_buttons(
+        level: int,
+        page: int | None,
+        pagination_buttons: tuple[tuple[str, str], ...],
+        product_id: int | None,
+        sizes: tuple[int]
 ):
     keyboard = InlineKeyboardBuilder()
 
@@ -173,7 +229,7 @@ def get_user_cart_buttons(
         keyboard.adjust(*sizes)
 
         row = []
-        for text, menu_name in pagination_buttons.items():
+        for text, menu_name in pagination_buttons:
             if menu_name == 'next':
                 row.append(InlineKeyboardButton(
                     text=text,
@@ -227,3 +283,40 @@ def get_callback_button(
     for text, date in button.items():
         keyboard.add(InlineKeyboardButton(text=text, callback_data=date))
     return keyboard.adjust(*sizes).as_markup()
+
+
+def get_admin_products_buttons(
+        *,
+        category: int,
+        page: int,
+        product_ids: list[int],
+        pages: int
+):
+    """Кнопки страницы ассортимента: номер кнопки = номер фото в альбоме."""
+    keyboard = InlineKeyboardBuilder()
+
+    for number, product_id in enumerate(product_ids, start=1):
+        keyboard.add(InlineKeyboardButton(
+            text=f"Изменить {number}",
+            callback_data=f"change_{product_id}"
+        ))
+        keyboard.add(InlineKeyboardButton(
+            text=f"Удалить {number}",
+            callback_data=f"delete_{product_id}"
+        ))
+    keyboard.adjust(2)
+
+    row = []
+    if page > 1:
+        row.append(InlineKeyboardButton(
+            text="◀ Пред.",
+            callback_data=f"products_{category}_{page - 1}"
+        ))
+    if page < pages:
+        row.append(InlineKeyboardButton(
+            text="След. ▶",
+            callback_data=f"products_{category}_{page + 1}"
+        ))
+    if row:
+        keyboard.row(*row)
+    return keyboard.as_markup()
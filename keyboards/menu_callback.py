@@ -0,0 +1,172 @@
+from collections import OrderedDict
+from enum import Enum
+from itertools import count
+
+from aiogram.filters import Filter
+from aiogram.types import CallbackQuery
+
+# Лимит Telegram на callback_data
+MAX_CALLBACK_DATA_BYTES = 64
+TOKEN_TABLE_SIZE = 10000
+
+PREFIX = "m"
+TOKEN_PREFIX = "t"
+LEGACY_PREFIX = "menu"
+SEPARATOR = ":"
+
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+class MenuName(Enum):
+    main = "main"
+    catalog = "catalog"
+    products = "products"
+    cart = "cart"
+    about = "about"
+    payment = "payment"
+    shipping = "shipping"
+    order = "order"
+    add_to_cart = "add_to_cart"
+    next = "next"
+    previous = "previous"
+    delete = "delete"
+    decrement = "decrement"
+    increment = "increment"
+
+
+# Код пункта меню - один символ base-36 по порядку объявления
+_NAME_TO_CODE = {
+    member.value: _DIGITS[index] for index, member in enumerate(MenuName)
+}
+_CODE_TO_NAME = {code: name for name, code in _NAME_TO_CODE.items()}
+
+
+def to_base36(number: int) -> str:
+    if number < 0:
+        return "-" + to_base36(-number)
+    if number < 36:
+        return _DIGITS[number]
+    digits = []
+    while number:
+        number, rest = divmod(number, 36)
+        digits.append(_DIGITS[rest])
+    return "".join(reversed(digits))
+
+
+def _pack_optional(number: int | None) -> str:
+    return "" if number is None else to_base36(number)
+
+
+def _unpack_optional(value: str) -> int | None:
+    return int(value, 36) if value else None
+
+
+class MenuCallBack:
+    """
+    Данные кнопок меню в компактном виде:
+    m:<level>:<код пункта>:<category>:<page>:<product_id>, числа в base-36.
+    Если строка все же не влезает в 64 байта, в кнопку кладется токен,
+    а сами данные хранятся в таблице токенов процесса.
+    """
+
+    __slots__ = ("level", "menu_name", "category", "page", "product_id")
+
+    _tokens: OrderedDict[str, str] = OrderedDict()
+    _token_ids = count()
+
+    def __init__(
+            self,
+            *,
+            level: int,
+            menu_name: str | MenuName,
+            category: int | None = None,
+            page: int = 1,
+            product_id: int | None = None,
+    ) -> None:
+        self.level = level
+        self.menu_name = MenuName(menu_name).value
+        self.category = category
+        self.page = page
+        self.product_id = product_id
+
+    def __repr__(self) -> str:
+        return (
+            f"MenuCallBack(level={self.level}, menu_name={self.menu_name!r}, "
+            f"category={self.category}, page={self.page}, "
+            f"product_id={self.product_id})"
+        )
+
+    def pack(self) -> str:
+        value = SEPARATOR.join((
+            PREFIX,
+            to_base36(self.level),
+            _NAME_TO_CODE[self.menu_name],
+            _pack_optional(self.category),
+            to_base36(self.page),
+            _pack_optional(self.product_id),
+        ))
+        if len(value.encode()) <= MAX_CALLBACK_DATA_BYTES:
+            return value
+        return self._store_token(value)
+
+    @classmethod
+    def _store_token(cls, value: str) -> str:
+        token = TOKEN_PREFIX + SEPARATOR + to_base36(next(cls._token_ids))
+        cls._tokens[token] = value
+        if len(cls._tokens) > TOKEN_TABLE_SIZE:
+            cls._tokens.popitem(last=False)
+        return token
+
+    @classmethod
+    def unpack(cls, value: str) -> "MenuCallBack":
+        """Разбирает callback_data, при неверном формате - ValueError."""
+        if value.startswith(TOKEN_PREFIX + SEPARATOR):
+            try:
+                value = cls._tokens[value]
+            except KeyError:
+                raise ValueError(f"Unknown callback token {value!r}")
+        parts = value.split(SEPARATOR)
+        if len(parts) != 6:
+            raise ValueError(f"Malformed callback data {value!r}")
+        prefix, level, menu_name, category, page, product_id = parts
+        if prefix == PREFIX:
+            try:
+                menu_name = _CODE_TO_NAME[menu_name]
+            except KeyError:
+                raise ValueError(f"Unknown menu code {menu_name!r}")
+            return cls(
+                level=int(level, 36),
+                menu_name=menu_name,
+                category=_unpack_optional(category),
+                page=int(page, 36),
+                product_id=_unpack_optional(product_id),
+            )
+        if prefix == LEGACY_PREFIX:
+            # Кнопки старого формата aiogram CallbackData в уже
+            # отправленных сообщениях; имя категории не хранилось в enum
+            if menu_name not in _NAME_TO_CODE:
+                menu_name = MenuName.products
+            return cls(
+                level=int(level),
+                menu_name=menu_name,
+                category=int(category) if category else None,
+                page=int(page),
+                product_id=int(product_id) if product_id else None,
+            )
+        raise ValueError(f"Unknown callback prefix {prefix!r}")
+
+    @classmethod
+    def filter(cls) -> "MenuCallBackFilter":
+        return MenuCallBackFilter()
+
+
+class MenuCallBackFilter(Filter):
+    """Пропускает колбэки меню и передает хендлеру callback_data."""
+
+    async def __call__(self, query: CallbackQuery) -> bool | dict:
+        if not isinstance(query, CallbackQuery) or not query.data:
+            return False
+        try:
+            return {"callback_data": MenuCallBack.unpack(query.data)}
+        except ValueError:
+            return False
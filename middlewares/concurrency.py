@@ -0,0 +1,67 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+from aiogram.types import TelegramObject
+
+
+class UserEventIsolation(BaseEventIsolation):
+    """
+    Апдейты одного пользователя обрабатываются строго по очереди.
+
+    Диспетчер берет блокировку до чтения состояния FSM. asyncio.Lock
+    (он FIFO) живет, пока у ключа есть апдейты в обработке, поэтому
+    память ограничена числом пользователей с апдейтами в работе,
+    в отличие от SimpleEventIsolation, который блокировки не удаляет.
+    """
+
+    def __init__(self) -> None:
+        # ключ -> [Lock, число апдейтов в работе]
+        self._locks: dict[StorageKey, list] = {}
+
+    @property
+    def keys(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def close(self) -> None:
+        self._locks.clear()
+
+
+class ConcurrencyLimit(BaseMiddleware):
+    """
+    Внешняя middleware апдейтов: не больше concurrency апдейтов
+    обрабатываются одновременно.
+
+    Порядок апдейтов одного пользователя обеспечивает UserEventIsolation
+    диспетчера, ее блокировка берется раньше этой middleware,
+    поэтому ждущие своей очереди апдейты одного пользователя место
+    не занимают.
+    """
+
+    def __init__(self, concurrency: int) -> None:
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        async with self._semaphore:
+            return await handler(event, data)
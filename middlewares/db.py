@@ -1,7 +1,53 @@
+import logging
+import time
 from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from utils.metrics import record_db_session
+
+logger = logging.getLogger(__name__)
+
+
+class LazySession:
+    """
+    Прокси AsyncSession: сессия создается при первом обращении,
+    а close() возвращает соединение в пул, не дожидаясь конца апдейта.
+    После close() сессией можно пользоваться снова, как и AsyncSession:
+    новая сессия получает info старой (например, признак RoutingSession,
+    что апдейт уже писал в основную БД).
+    """
+
+    def __init__(self, session_pool: async_sessionmaker) -> None:
+        self._session_pool = session_pool
+        self._session: AsyncSession | None = None
+        self._info = {}
+        self._opened_at = None
+        self.uses = 0
+        self.held = 0.0
+
+    @property
+    def used(self) -> bool:
+        return self.uses > 0
+
+    def _get_session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._session_pool()
+            self._session.info.update(self._info)
+            self._opened_at = time.perf_counter()
+            self.uses += 1
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self._get_session(), name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            session, self._session = self._session, None
+            self._info.update(session.info)
+            await session.close()
+            self.held += time.perf_counter() - self._opened_at
 
 
 class DataBaseSession(BaseMiddleware):
@@ -14,6 +60,16 @@ class DataBaseSession(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        async with self.session_pool() as session:
-            data['session'] = session
+        session = LazySession(self.session_pool)
+        data['session'] = session
+        try:
             return await handler(event, data)
+        finally:
+            await session.close()
+            record_db_session(session.used, session.held)
+            logger.debug(
+                "Update %s: %d session(s), connection held %.1f ms",
+                getattr(event, "update_id", None),
+                session.uses,
+                session.held * 1000,
+            )
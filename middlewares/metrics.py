@@ -0,0 +1,54 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from keyboards.menu_callback import MenuCallBack
+from utils.metrics import UpdateStats, current_update, record_update
+
+
+class UpdateMetrics(BaseMiddleware):
+    """
+    Внешняя middleware апдейтов: замеряет полное время обработки,
+    время и число запросов к БД и пишет их в гистограммы.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        stats = UpdateStats()
+        token = current_update.set(stats)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            record_update(stats, time.perf_counter() - started)
+            current_update.reset(token)
+
+
+class HandlerLabels(BaseMiddleware):
+    """
+    Внутренняя middleware событий: к этому моменту хендлер уже выбран,
+    поэтому здесь статистика апдейта получает метки роутера и хендлера.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        stats = current_update.get()
+        if stats is not None:
+            callback = data["handler"].callback
+            stats.router = callback.__module__.rsplit(".", 1)[-1]
+            stats.handler = callback.__name__
+            callback_data = data.get("callback_data")
+            if isinstance(callback_data, MenuCallBack):
+                stats.level = str(callback_data.level)
+                stats.menu_name = callback_data.menu_name
+        return await handler(event, data)
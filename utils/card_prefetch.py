@@ -0,0 +1,134 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from aiogram.types import InlineKeyboardMarkup
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.engine import session_maker
+from database.notify import on_catalog_changed
+from keyboards.menu_callback import MenuCallBack, MenuName
+from utils.menu_processing import get_menu_content
+
+logger = logging.getLogger(__name__)
+
+CARD_PREFETCH_TTL = float(os.getenv('CARD_PREFETCH_TTL', 30))
+CARD_PREFETCH_USERS = int(os.getenv('CARD_PREFETCH_USERS', 5000))
+CARD_PREFETCH_CONCURRENCY = int(os.getenv('CARD_PREFETCH_CONCURRENCY', 4))
+
+
+class CardPrefetch:
+    """
+    Заранее рисует карточки товаров, на которые ведут кнопки
+    "◀ Пред." и "След. ▶" только что показанной карточки.
+
+    Готовые (media, клавиатура) хранятся по callback_data кнопки
+    отдельно для каждого пользователя: только соседи последней
+    карточки, не дольше ttl секунд, не больше max_users пользователей.
+    Одновременно рисуется не больше concurrency карточек, а если
+    очередь уже длиннее max_pending, новые заказы отбрасываются.
+    """
+
+    def __init__(
+            self,
+            session_pool: async_sessionmaker,
+            ttl: float = CARD_PREFETCH_TTL,
+            max_users: int = CARD_PREFETCH_USERS,
+            concurrency: int = CARD_PREFETCH_CONCURRENCY,
+    ) -> None:
+        self.session_pool = session_pool
+        self.ttl = ttl
+        self.max_users = max_users
+        self.max_pending = concurrency * 4
+        self.hits = 0
+        self.misses = 0
+        # user_id -> {callback_data: (истекает, media, клавиатура)}
+        self._cards: OrderedDict[int, dict[str, tuple]] = OrderedDict()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: set[asyncio.Task] = set()
+
+    def get(self, user_id: int, callback_data: str):
+        """(media, клавиатура) для нажатой кнопки или None."""
+        card = self._cards.get(user_id, {}).get(callback_data)
+        if card is None or card[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return card[1], card[2]
+
+    def schedule(
+            self,
+            user_id: int,
+            reply_markup: InlineKeyboardMarkup
+    ) -> None:
+        """Заказывает карточки для кнопок листания reply_markup."""
+        old_cards = self._cards.pop(user_id, {})
+        # None - карточка заказана, но еще не готова; карточки
+        # для кнопок прошлой страницы больше не нужны
+        cards = self._cards[user_id] = {
+            data: old_cards.get(data)
+            for data in self._page_buttons(reply_markup)
+        }
+        if len(self._cards) > self.max_users:
+            self._cards.popitem(last=False)
+
+        for data, card in cards.items():
+            if card is not None and card[0] >= time.monotonic():
+                continue
+            if len(self._tasks) >= self.max_pending:
+                return
+            # Чистый контекст: запросы предзагрузки не попадают
+            # в метрики апдейта, который ее заказал
+            task = asyncio.create_task(
+                self._render(user_id, data),
+                context=contextvars.Context()
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    def _page_buttons(reply_markup: InlineKeyboardMarkup) -> list[str]:
+        return [
+            button.callback_data
+            for row in reply_markup.inline_keyboard
+            for button in row
+            if button.callback_data
+            and MenuCallBack.unpack(button.callback_data).menu_name
+            in (MenuName.next.value, MenuName.previous.value)
+        ]
+
+    async def _render(self, user_id: int, data: str) -> None:
+        callback_data = MenuCallBack.unpack(data)
+        try:
+            async with self._semaphore:
+                async with self.session_pool() as session:
+                    media, reply_markup = await get_menu_content(
+                        session,
+                        level=callback_data.level,
+                        menu_name=callback_data.menu_name,
+                        category=callback_data.category,
+                        page=callback_data.page,
+                        product_id=callback_data.product_id,
+                        user_id=user_id,
+                    )
+        except Exception:
+            logger.exception("Failed to prefetch product card %s", data)
+            return
+        cards = self._cards.get(user_id)
+        # Пользователь мог уже уйти на другую страницу
+        if cards is not None and data in cards:
+            cards[data] = (time.monotonic() + self.ttl, media, reply_markup)
+
+    def clear(self) -> None:
+        self._cards.clear()
+
+
+card_prefetch = CardPrefetch(session_maker)
+
+
+@on_catalog_changed
+async def _clear_card_prefetch(session):
+    card_prefetch.clear()
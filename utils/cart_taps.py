@@ -0,0 +1,167 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+
+from aiogram.types import CallbackQuery
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database.engine import session_maker
+from keyboards.menu_callback import MenuCallBack
+from utils.menu_processing import get_menu_content
+from utils.metrics import UpdateStats, current_update, record_update
+from utils.rendered_views import rendered_views
+
+logger = logging.getLogger(__name__)
+
+# Окно (в секундах), в котором нажатия +1/-1 одного товара сливаются,
+# 0 - каждое нажатие обрабатывается сразу
+CART_TAP_WINDOW = float(os.getenv('CART_TAP_WINDOW', 0.3))
+
+
+class PendingTaps:
+    __slots__ = ("delta", "callback", "callback_data", "timer")
+
+    def __init__(self, callback, callback_data) -> None:
+        self.delta = 0
+        self.callback = callback
+        self.callback_data = callback_data
+        self.timer: asyncio.Task | None = None
+
+
+class CartTaps:
+    """
+    Сливает серию нажатий +1/-1 по товару корзины в одно изменение
+    количества, один запрос к БД и одно редактирование сообщения.
+
+    Первое нажатие запускает таймер на window секунд, следующие только
+    меняют накопленную дельту. Любой другой апдейт пользователя сначала
+    вызывает flush_user(), поэтому его ответ не обгонит отложенную
+    перерисовку корзины.
+    """
+
+    def __init__(
+            self,
+            session_pool: async_sessionmaker,
+            window: float = CART_TAP_WINDOW
+    ) -> None:
+        self.session_pool = session_pool
+        self.window = window
+        # user_id -> {product_id: PendingTaps}
+        self._pending: dict[int, dict[int, PendingTaps]] = {}
+        # user_id -> задачи, которые уже применяют нажатия
+        self._running: dict[int, set[asyncio.Task]] = {}
+
+    def tap(
+            self,
+            callback: CallbackQuery,
+            callback_data: MenuCallBack
+    ) -> None:
+        user_id = callback.from_user.id
+        product_id = callback_data.product_id
+        user_taps = self._pending.setdefault(user_id, {})
+        pending = user_taps.get(product_id)
+        if pending is None:
+            pending = user_taps[product_id] = PendingTaps(
+                callback,
+                callback_data
+            )
+            # Чистый контекст: апдейт нажатия уже записан в метрики,
+            # запросы окна считаются отдельно, см. _flush_later
+            pending.timer = asyncio.create_task(
+                self._flush_later(user_id, product_id),
+                context=contextvars.Context()
+            )
+        pending.delta += 1 if callback_data.menu_name == "increment" else -1
+        # Перерисовываем то сообщение и ту страницу, где нажали последним
+        pending.callback = callback
+        pending.callback_data = callback_data
+
+    def _pop(self, user_id: int, product_id: int) -> PendingTaps | None:
+        user_taps = self._pending.get(user_id)
+        if not user_taps:
+            return None
+        pending = user_taps.pop(product_id, None)
+        if not user_taps:
+            del self._pending[user_id]
+        return pending
+
+    async def _flush_later(self, user_id: int, product_id: int) -> None:
+        await asyncio.sleep(self.window)
+        pending = self._pop(user_id, product_id)
+        if pending is None:
+            return
+        task = asyncio.current_task()
+        running = self._running.setdefault(user_id, set())
+        # Прошлое окно пользователя может еще применяться (например,
+        # ждать лимита на правку сообщений) - правки идут по очереди
+        previous = set(running)
+        running.add(task)
+        stats = UpdateStats()
+        stats.router = "cart_taps"
+        stats.handler = "flush"
+        stats.level = str(pending.callback_data.level)
+        stats.menu_name = pending.callback_data.menu_name
+        try:
+            if previous:
+                await asyncio.wait(previous)
+            current_update.set(stats)
+            started = time.perf_counter()
+            await self._apply(pending)
+            record_update(stats, time.perf_counter() - started)
+        finally:
+            running.discard(task)
+            if not running:
+                del self._running[user_id]
+
+    async def _apply(self, pending: PendingTaps) -> None:
+        if not pending.delta:
+            # +1 и -1 взаимно сократились: менять нечего
+            return
+        callback_data = pending.callback_data
+        try:
+            async with self.session_pool() as session:
+                media, reply_markup = await get_menu_content(
+                    session,
+                    level=callback_data.level,
+                    menu_name=(
+                        "increment" if pending.delta > 0 else "decrement"
+                    ),
+                    page=callback_data.page,
+                    product_id=callback_data.product_id,
+                    user_id=pending.callback.from_user.id,
+                    quantity=abs(pending.delta),
+                )
+            await rendered_views.edit(
+                pending.callback.message,
+                media,
+                reply_markup
+            )
+        except Exception:
+            logger.exception(
+                "Failed to apply %+d cart taps for user %s",
+                pending.delta,
+                pending.callback.from_user.id,
+            )
+
+    async def flush_user(self, user_id: int) -> None:
+        """Применяет отложенные нажатия пользователя и ждет их."""
+        user_taps = self._pending.pop(user_id, {})
+        for pending in user_taps.values():
+            pending.timer.cancel()
+        # Сначала - уже начатые применения, потом отложенные, по очереди
+        running = self._running.get(user_id)
+        if running:
+            await asyncio.wait(set(running))
+        for pending in user_taps.values():
+            await self._apply(pending)
+
+    async def close(self) -> None:
+        for user_id in list(self._pending):
+            await self.flush_user(user_id)
+        for running in list(self._running.values()):
+            await asyncio.wait(set(running))
+
+
+cart_taps = CartTaps(session_maker)
@@ -0,0 +1,175 @@
+import asyncio
+import heapq
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_USER = 0
+PRIORITY_BULK = 1
+
+_priority: ContextVar[int] = ContextVar("priority", default=PRIORITY_USER)
+
+# Лимиты Telegram касаются сообщений: отправки, пересылки и правки.
+# answerCallbackQuery, getUpdates и т.п. идут без очереди
+LIMITED_METHOD_PREFIXES = ("send", "edit", "copy", "forward")
+
+
+@contextmanager
+def bulk_priority():
+    """Запросы внутри блока пропускают вперед себя ответы пользователям."""
+    token = _priority.set(PRIORITY_BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def delay(self) -> float:
+        """Сколько ждать до следующего токена, 0 - токен есть."""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+        # Токены копятся только после паузы, без залпа сразу после 429
+        self.updated = self.paused_until
+
+
+class OutboundScheduler:
+    """
+    Глобальный и початовые token bucket для исходящих запросов.
+    Глобальные токены раздаются по приоритету, внутри приоритета - FIFO.
+    """
+
+    def __init__(
+            self,
+            global_rate: float = 30,
+            chat_rate: float = 1,
+            chat_burst: float = 3,
+            max_chats: int = 10000,
+    ) -> None:
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self.chat_buckets: OrderedDict[int, TokenBucket] = OrderedDict()
+        self._waiters = []
+        self._order = count()
+        self._pump: asyncio.Task | None = None
+
+    def chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(
+                self.chat_rate,
+                self.chat_burst
+            )
+            if len(self.chat_buckets) > self.max_chats:
+                self.chat_buckets.popitem(last=False)
+        else:
+            self.chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def acquire(self, chat_id: int | None, priority: int) -> None:
+        if chat_id is not None:
+            bucket = self.chat_bucket(chat_id)
+            while delay := bucket.delay():
+                await asyncio.sleep(delay)
+            bucket.take()
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._release_waiters())
+        await waiter
+
+    async def _release_waiters(self) -> None:
+        while self._waiters:
+            if delay := self.global_bucket.delay():
+                await asyncio.sleep(delay)
+                continue
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                self.global_bucket.take()
+                waiter.set_result(None)
+
+    def pause(self, chat_id: int | None, seconds: float) -> None:
+        if chat_id is None:
+            self.global_bucket.pause(seconds)
+        else:
+            self.chat_bucket(chat_id).pause(seconds)
+
+
+class FloodControl(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: пропускает запросы, отправляющие и меняющие
+    сообщения, через OutboundScheduler, а на TelegramRetryAfter
+    приостанавливает чат (или все такие запросы, если чата нет)
+    на retry_after и повторяет запрос. Остальные запросы идут без
+    очереди, но на TelegramRetryAfter тоже ждут retry_after и повторяются.
+    """
+
+    def __init__(
+            self,
+            scheduler: OutboundScheduler | None = None,
+            max_retries: int = 3,
+    ) -> None:
+        self.scheduler = scheduler or OutboundScheduler()
+        self.max_retries = max_retries
+
+    async def __call__(self, make_request, bot, method):
+        limited = method.__api_method__.startswith(LIMITED_METHOD_PREFIXES)
+        chat_id = getattr(method, "chat_id", None)
+        if not isinstance(chat_id, int):
+            # Каналы по username лимитируются только глобально
+            chat_id = None
+        priority = _priority.get()
+        for attempt in range(self.max_retries + 1):
+            if limited:
+                await self.scheduler.acquire(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as error:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(
+                    "Flood control on %s for chat %s, retry in %s s",
+                    method.__api_method__,
+                    chat_id,
+                    error.retry_after,
+                )
+                if limited:
+                    self.scheduler.pause(chat_id, error.retry_after)
+                else:
+                    await asyncio.sleep(error.retry_after)
@@ -1,13 +1,17 @@
 from aiogram.types import InputMediaPhoto
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from database.catalog import catalog as catalog_cache
+from database.routing import primary_reads
 from database.orm_query import (
     orm_add_to_cart,
     orm_delete_from_cart,
     orm_get_banner,
+    orm_get_adjacent_product,
     orm_get_categories,
-    orm_get_all_products,
-    orm_get_user_carts,
+    orm_get_products_count,
+    orm_get_products_window,
+    orm_get_user_cart_page,
     orm_reduce_product_in_cart,
 )
 from keyboards.inline import (
@@ -20,8 +24,69 @@ from keyboards.inline import (
 from utils.paginator import Paginator
 
 
+"""Чтение каталога: из снимка в памяти, а до его загрузки - из БД"""
+
+
+async def get_banner(session, name):
+    if catalog_cache.ready:
+        return catalog_cache.get_banner(name)
+    return await orm_get_banner(session, name)
+
+
+async def get_categories(session):
+    if catalog_cache.ready:
+        return catalog_cache.get_categories()
+    return await orm_get_categories(session)
+
+
+async def get_products_paginator(
+        session,
+        category,
+        page,
+        menu_name,
+        product_id
+):
+    if catalog_cache.ready:
+        products = catalog_cache.get_products(category)
+        # Товар могли удалить, пока пользователь листал
+        return Paginator(products, page=min(page, len(products)) or 1)
+
+    # Число товаров кэшируется из основной БД, окно читаем оттуда же:
+    # отстающая реплика может еще не знать о новом товаре
+    with primary_reads():
+        total = await orm_get_products_count(session, category_id=category)
+        page = min(page, total) or 1
+
+        product = None
+        if product_id and menu_name in ("next", "previous"):
+            product = await orm_get_adjacent_product(
+                session,
+                category_id=category,
+                product_id=product_id,
+                forward=menu_name == "next",
+            )
+        if product is None:
+            window = await orm_get_products_window(
+                session,
+                category_id=category,
+                offset=page - 1,
+            )
+            if not window and page > 1:
+                # Счетчик из кэша мог устареть после удаления товаров
+                page = 1
+                window = await orm_get_products_window(
+                    session,
+                    category_id=category,
+                    offset=0,
+                )
+        else:
+            window = [product]
+
+    return Paginator(window, page=page, total=total)
+
+
 async def main_menu(session, level, menu_name):
-    banner = await orm_get_banner(session, menu_name)
+    banner = await get_banner(session, menu_name)
     image = InputMediaPhoto(media=banner.image, caption=banner.description)
 
     keyboards = get_user_main_button(level=level)
@@ -30,10 +95,10 @@ async def main_menu(session, level, menu_name):
 
 
 async def catalog(session, level, menu_name):
-    banner = await orm_get_banner(session, menu_name)
+    banner = await get_banner(session, menu_name)
     image = InputMediaPhoto(media=banner.image, caption=banner.description)
 
-    categories = await orm_get_categories(session)
+    categories = await get_categories(session)
     keyboards = get_user_catalog_buttons(level=level, categories=categories)
 
     return image, keyboards
@@ -50,10 +115,17 @@ def pages(paginator: Paginator):
     return btns
 
 
-async def products(session, level, category, page):
-    products = await orm_get_all_products(session, category_id=category)
-
-    paginator = Paginator(products, page=page)
+async def products(session, level, category, page, menu_name, product_id):
+    paginator = await get_products_paginator(
+        session,
+        category,
+        page,
+        menu_name,
+        product_id
+    )
+    if not paginator.get_page():
+        # В категории не осталось товаров
+        return await catalog(session, 1, "catalog")
     product = paginator.get_page()[0]
 
     image = InputMediaPhoto(
@@ -70,7 +142,7 @@ async def products(session, level, category, page):
     keyboards = get_products_buttons(
         level=level,
         category=category,
-        page=page,
+        page=paginator.page,
         pagination_buttons=pagination_buttons,
         product_id=product.id,
     )
@@ -78,7 +150,15 @@ async def products(session, level, category, page):
     return image, keyboards
 
 
-async def carts(session, level, menu_name, page, user_id, product_id):
+async def carts(
+        session,
+        level,
+        menu_name,
+        page,
+        user_id,
+        product_id,
+        quantity=1
+):
     if menu_name == "delete":
         await orm_delete_from_cart(session, user_id, product_id)
         if page > 1:
@@ -87,17 +167,22 @@ async def carts(session, level, menu_name, page, user_id, product_id):
         is_cart = await orm_reduce_product_in_cart(
             session,
             user_id,
-            product_id
+            product_id,
+            quantity
         )
         if page > 1 and not is_cart:
             page -= 1
     elif menu_name == "increment":
-        await orm_add_to_cart(session, user_id, product_id)
+        await orm_add_to_cart(session, user_id, product_id, quantity)
 
-    carts = await orm_get_user_carts(session, user_id)
+    cart = await orm_get_user_cart_page(session, user_id, page)
+    if cart is None and page > 1:
+        # Страница могла исчезнуть из-за параллельного изменения корзины
+        page = 1
+        cart = await orm_get_user_cart_page(session, user_id, page)
 
-    if not carts:
-        banner = await orm_get_banner(session, "cart")
+    if cart is None:
+        banner = await get_banner(session, "cart")
         image = InputMediaPhoto(
             media=banner.image,
             caption=f"<strong>{banner.description}</strong>"
@@ -111,19 +196,15 @@ async def carts(session, level, menu_name, page, user_id, product_id):
         )
 
     else:
-        paginator = Paginator(carts, page=page)
-
-        cart = paginator.get_page()[0]
+        paginator = Paginator([cart], page=page, total=cart.lines)
 
-        cart_price = round(cart.quantity * cart.product.price, 2)
-        total_price = round(
-            sum(cart.quantity * cart.product.price for cart in carts), 2
-        )
+        cart_price = round(cart.quantity * cart.price, 2)
+        total_price = round(cart.total_price, 2)
         image = InputMediaPhoto(
-            media=cart.product.image,
+            media=cart.image,
             caption=(
-                f"<strong>{cart.product.name}</strong>\n"
-                f"{cart.product.price}₽ x {cart.quantity} "
+                f"<strong>{cart.name}</strong>\n"
+                f"{cart.price}₽ x {cart.quantity} "
                 f"= {cart_price}₽"
                 f"\nТовар {paginator.page} из {paginator.pages} в корзине."
                 f"\nОбщая стоимость товаров в корзине {total_price} ₽"
@@ -136,7 +217,7 @@ async def carts(session, level, menu_name, page, user_id, product_id):
             level=level,
             page=page,
             pagination_buttons=pagination_buttons,
-            product_id=cart.product.id,
+            product_id=cart.product_id,
         )
 
     return image, keyboards
@@ -150,13 +231,21 @@ async def get_menu_content(
     page: int | None = None,
     product_id: int | None = None,
     user_id: int | None = None,
+    quantity: int = 1,
 ):
     if level == 0:
         return await main_menu(session, level, menu_name)
     elif level == 1:
         return await catalog(session, level, menu_name)
     elif level == 2:
-        return await products(session, level, category, page)
+        return await products(
+            session,
+            level,
+            category,
+            page,
+            menu_name,
+            product_id
+        )
     elif level == 3:
         return await carts(
             session,
@@ -164,5 +253,6 @@ async def get_menu_content(
             menu_name,
             page,
             user_id,
-            product_id
+            product_id,
+            quantity
         )
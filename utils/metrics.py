@@ -0,0 +1,225 @@
+import bisect
+import time
+from contextvars import ContextVar
+
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from database.cache import caches
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+LABELS = ("router", "handler", "level", "menu_name")
+
+
+class UpdateStats:
+    """Счетчики одного апдейта, их заполняют middleware и хуки SQLAlchemy."""
+
+    __slots__ = (
+        "router",
+        "handler",
+        "level",
+        "menu_name",
+        "db_time",
+        "queries",
+    )
+
+    def __init__(self) -> None:
+        self.router = ""
+        self.handler = "unhandled"
+        self.level = ""
+        self.menu_name = ""
+        self.db_time = 0.0
+        self.queries = 0
+
+    @property
+    def labels(self) -> tuple[str, ...]:
+        return (self.router, self.handler, self.level, self.menu_name)
+
+
+current_update: ContextVar[UpdateStats | None] = ContextVar(
+    "current_update",
+    default=None
+)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # labels -> [счетчики по корзинам..., сумма, количество]
+        self.series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, labels: tuple[str, ...], value: float) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * len(self.buckets) + [0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, series in sorted(self.series.items()):
+            base = ",".join(
+                f'{name}="{_escape(value)}"'
+                for name, value in zip(LABELS, labels)
+            )
+            cumulative = 0
+            for bound, hits in zip(self.buckets, series):
+                cumulative += hits
+                lines.append(
+                    f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'{self.name}_bucket{{{base},le="+Inf"}} {series[-1]}'
+            )
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    )
+
+
+update_duration = Histogram(
+    "bot_update_duration_seconds",
+    "Wall time of update processing.",
+    LATENCY_BUCKETS,
+)
+update_db_duration = Histogram(
+    "bot_update_db_seconds",
+    "Time spent in database queries per update.",
+    LATENCY_BUCKETS,
+)
+update_queries = Histogram(
+    "bot_update_queries",
+    "Database queries executed per update.",
+    QUERY_BUCKETS,
+)
+update_connection_held = Histogram(
+    "bot_update_db_connection_seconds",
+    "Time a pooled database connection was held per update.",
+    LATENCY_BUCKETS,
+)
+HISTOGRAMS = (
+    update_duration,
+    update_db_duration,
+    update_queries,
+    update_connection_held,
+)
+
+# Апдейты, прошедшие через DataBaseSession, и те из них, что открыли сессию
+db_session_counts = {"updates": 0, "updates_with_db": 0}
+
+
+def record_update(stats: UpdateStats, duration: float) -> None:
+    labels = stats.labels
+    update_duration.observe(labels, duration)
+    update_db_duration.observe(labels, stats.db_time)
+    update_queries.observe(labels, stats.queries)
+
+
+def record_db_session(used: bool, held: float) -> None:
+    db_session_counts["updates"] += 1
+    if used:
+        db_session_counts["updates_with_db"] += 1
+    stats = current_update.get()
+    if stats is not None:
+        update_connection_held.observe(stats.labels, held)
+
+
+def render_db_session_counters() -> list[str]:
+    return [
+        "# HELP bot_updates_total Updates passed to handlers.",
+        "# TYPE bot_updates_total counter",
+        f"bot_updates_total {db_session_counts['updates']}",
+        "# HELP bot_updates_with_db_total Updates that opened a DB session.",
+        "# TYPE bot_updates_with_db_total counter",
+        f"bot_updates_with_db_total {db_session_counts['updates_with_db']}",
+    ]
+
+
+CACHE_COUNTERS = (
+    ("bot_cache_hits_total", "hits", "Read-through cache hits."),
+    ("bot_cache_misses_total", "misses", "Read-through cache misses."),
+    (
+        "bot_cache_coalesced_total",
+        "coalesced",
+        "Misses served by a concurrent identical query.",
+    ),
+    ("bot_cache_evictions_total", "evictions", "LRU evictions."),
+)
+
+
+def render_cache_counters() -> list[str]:
+    lines = []
+    for name, attribute, documentation in CACHE_COUNTERS:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} counter")
+        for cache in caches:
+            lines.append(
+                f'{name}{{cache="{cache.name}"}} {getattr(cache, attribute)}'
+            )
+    return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.extend(render_db_session_counters())
+    lines.extend(render_cache_counters())
+    return "\n".join(lines) + "\n"
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Учитывает время и число SQL-запросов в статистике текущего апдейта."""
+
+    # Время старта хранится в контексте выполнения: если запрос упал,
+    # after_cursor_execute не вызывается, и ничего не остается висеть
+    # на соединении из пула
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters,
+                              context, executemany):
+        if context is not None:
+            context.query_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters,
+                             context, executemany):
+        started = getattr(context, "query_started", None)
+        stats = current_update.get()
+        if stats is not None and started is not None:
+            stats.db_time += time.perf_counter() - started
+            stats.queries += 1
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        text=render_metrics(),
+        content_type="text/plain",
+        charset="utf-8",
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
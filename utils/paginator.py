@@ -3,16 +3,33 @@ import math
 
 class Paginator:
 
-    def __init__(self, array: list | tuple, page: int = 1, per_page: int = 1):
+    def __init__(
+            self,
+            array: list | tuple,
+            page: int = 1,
+            per_page: int = 1,
+            total: int | None = None
+    ):
+        """
+        Если передан total, array считается окном выборки из БД,
+        начинающимся с текущей страницы, а total - общим числом записей.
+        """
         self.array = array
         self.per_page = per_page
         self.page = page
-        self.len = len(self.array)
+        self.len = len(self.array) if total is None else total
         self.pages = math.ceil(self.len / self.per_page)
+        self.window_start = 0 if total is None else self.offset
+
+    @property
+    def offset(self):
+        return (self.page - 1) * self.per_page
 
     def __get_slice(self):
-        start = (self.page - 1) * self.per_page
+        start = self.offset - self.window_start
         stop = start + self.per_page
+        if start < 0:
+            return self.array[0:0]
         return self.array[start:stop]
 
     def get_page(self):
@@ -0,0 +1,130 @@
+"""
+Импорт и экспорт товаров файлами CSV и JSON.
+
+Колонки: id, name, description, price, image, category.
+Строки без id добавляются, с id - изменяют существующий товар.
+JSON - массив объектов или по объекту на строку (JSON Lines).
+Файлы читаются и пишутся потоково, без загрузки каталога в память.
+"""
+import csv
+import json
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.orm_query import orm_iter_products
+from utils.validators import (
+    validate_description,
+    validate_image,
+    validate_name,
+    validate_price
+)
+
+FIELDS = ("id", "name", "description", "price", "image", "category")
+FORMATS = ("csv", "json")
+CHUNK_SIZE = 65536
+
+
+def iter_csv(file):
+    """(номер строки, словарь) для каждой строки CSV после заголовка."""
+    reader = csv.DictReader(file)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_json(file):
+    """(номер объекта, словарь) без чтения всего файла в память."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+    number = 0
+    while True:
+        buffer = buffer.lstrip(" \t\r\n,[]")
+        if not buffer:
+            if eof:
+                return
+            chunk = file.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Объект не поместился в буфер целиком - дочитываем
+            chunk = file.read(CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        number += 1
+        yield number, obj
+
+
+def validate_product(data, category_ids: set[int]) -> str | None:
+    """Те же правила, что и при добавлении товара через бота."""
+    if not isinstance(data, dict):
+        return "ожидается объект с полями товара"
+    missing = [
+        field for field in FIELDS[1:]
+        if data.get(field) is None or not str(data[field]).strip()
+    ]
+    if missing:
+        return f"не заполнены поля: {', '.join(missing)}"
+    for field in ("id", "category"):
+        if data.get(field) and not str(data[field]).strip().isdigit():
+            return f"{field} должен быть целым числом"
+    if int(data["category"]) not in category_ids:
+        return f"нет категории с id {data['category']}"
+    return (
+        validate_name(str(data["name"]))
+        or validate_description(str(data["description"]))
+        or validate_price(data["price"])
+        or validate_image(str(data["image"]))
+    )
+
+
+def parse_products(file, file_format: str, category_ids: set[int], errors):
+    """
+    Отдает только корректные строки, ошибки складывает в errors
+    парами (номер строки, текст ошибки). Испорченный файл
+    (csv.Error, json.JSONDecodeError) прерывает импорт целиком.
+    """
+    rows = iter_csv(file) if file_format == "csv" else iter_json(file)
+    for number, data in rows:
+        if error := validate_product(data, category_ids):
+            errors.append((number, error))
+            continue
+        yield {
+            "id": data.get("id"),
+            "name": str(data["name"]),
+            "description": str(data["description"]),
+            "price": str(data["price"]).strip(),
+            "image": str(data["image"]),
+            "category": data["category"],
+        }
+
+
+async def export_products(session: AsyncSession, file, file_format: str):
+    """Пишет все товары в открытый текстовый файл, возвращает их число."""
+    written = 0
+    if file_format == "csv":
+        writer = csv.writer(file)
+        writer.writerow(FIELDS)
+    else:
+        file.write("[")
+    async for batch in orm_iter_products(session):
+        if file_format == "csv":
+            writer.writerows(batch)
+        else:
+            for index, row in enumerate(batch):
+                file.write(",\n" if written or index else "\n")
+                file.write(json.dumps(
+                    dict(zip(FIELDS, row)),
+                    ensure_ascii=False,
+                    default=str
+                ))
+        written += len(batch)
+    if file_format == "json":
+        file.write("\n]\n")
+    return written
@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, InputMediaPhoto, Message
+
+# Сколько последних сообщений бота помнить
+RENDERED_VIEWS_SIZE = 10000
+# Сколько секунд доверять отпечатку
+RENDERED_VIEWS_TTL = 60
+
+
+def fingerprint(
+        media: InputMediaPhoto,
+        reply_markup: InlineKeyboardMarkup | None
+) -> tuple[str, int, int]:
+    markup = reply_markup.model_dump_json() if reply_markup else ""
+    return media.media, hash(media.caption), hash(markup)
+
+
+class RenderedViews:
+    """
+    Отпечатки (фото, подпись, клавиатура) последних показанных экранов
+    по (chat_id, message_id) в LRU.
+
+    edit() не трогает сообщение, если экран не изменился, а если
+    изменились только подпись или только клавиатура - обходится
+    edit_message_caption / edit_message_reply_markup вместо edit_media.
+
+    Отпечатки знает только этот процесс, а сообщение может изменить
+    и другой, поэтому отпечатку доверяют не дольше ttl секунд.
+    Если апдейты одного чата могут попасть на разные процессы
+    (несколько реплик за вебхуком), нужен ttl=0: тогда каждый экран
+    отправляется через edit_media.
+    """
+
+    def __init__(
+            self,
+            size: int = RENDERED_VIEWS_SIZE,
+            ttl: float = RENDERED_VIEWS_TTL
+    ) -> None:
+        self.size = size
+        self.ttl = ttl
+        # (chat_id, message_id) -> (истекает, отпечаток)
+        self._views: OrderedDict[tuple[int, int], tuple] = OrderedDict()
+
+    def remember(
+            self,
+            message: Message,
+            media: InputMediaPhoto,
+            reply_markup: InlineKeyboardMarkup | None
+    ) -> None:
+        if not self.ttl:
+            return
+        key = (message.chat.id, message.message_id)
+        self._views[key] = (
+            time.monotonic() + self.ttl,
+            fingerprint(media, reply_markup)
+        )
+        self._views.move_to_end(key)
+        if len(self._views) > self.size:
+            self._views.popitem(last=False)
+
+    async def edit(
+            self,
+            message: Message,
+            media: InputMediaPhoto,
+            reply_markup: InlineKeyboardMarkup | None
+    ) -> bool:
+        """Показывает экран в message, False - если он уже показан."""
+        key = (message.chat.id, message.message_id)
+        item = self._views.get(key)
+        old = item[1] if item and item[0] > time.monotonic() else None
+        new = fingerprint(media, reply_markup)
+        if old == new:
+            self._views.move_to_end(key)
+            return False
+        try:
+            if old is None or old[0] != new[0]:
+                await message.edit_media(
+                    media=media,
+                    reply_markup=reply_markup
+                )
+            elif old[1] != new[1]:
+                await message.edit_caption(
+                    caption=media.caption,
+                    reply_markup=reply_markup
+                )
+            else:
+                await message.edit_reply_markup(reply_markup=reply_markup)
+        except TelegramBadRequest as error:
+            if "message is not modified" not in error.message:
+                self._views.pop(key, None)
+                raise
+        self.remember(message, media, reply_markup)
+        return True
+
+
+rendered_views = RenderedViews()
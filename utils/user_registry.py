@@ -0,0 +1,141 @@
+import asyncio
+import contextvars
+import logging
+import os
+from collections import OrderedDict
+
+from aiogram.types import User
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database.engine import session_maker
+from database.orm_query import orm_add_users
+
+logger = logging.getLogger(__name__)
+
+# Через сколько секунд записывать новых пользователей пачкой
+USER_FLUSH_INTERVAL = float(os.getenv('USER_FLUSH_INTERVAL', 1))
+USER_FLUSH_BATCH = int(os.getenv('USER_FLUSH_BATCH', 500))
+KNOWN_USERS_SIZE = int(os.getenv('KNOWN_USERS_SIZE', 100000))
+
+
+class UserRegistry:
+    """
+    Запись пользователей в БД с отложенной записью (write-behind).
+
+    remember() ничего не делает для уже записанных пользователей,
+    а новых копит и через interval секунд записывает пачкой
+    INSERT ... ON CONFLICT DO NOTHING. Перед записью в корзину
+    вызывается ensure(): он сразу записывает пользователя (вместе
+    со всеми накопленными), чтобы не нарушить внешний ключ Cart.user_id.
+    """
+
+    def __init__(
+            self,
+            session_pool: async_sessionmaker,
+            interval: float = USER_FLUSH_INTERVAL,
+            batch_size: int = USER_FLUSH_BATCH,
+            known_size: int = KNOWN_USERS_SIZE,
+    ) -> None:
+        self.session_pool = session_pool
+        self.interval = interval
+        self.batch_size = batch_size
+        self.known_size = known_size
+        # user_id уже записанных пользователей, LRU
+        self._known: OrderedDict[int, None] = OrderedDict()
+        # user_id -> строка для вставки
+        self._pending: dict[int, dict] = {}
+        self._timer: asyncio.Task | None = None
+
+    def is_known(self, user_id: int) -> bool:
+        if user_id not in self._known:
+            return False
+        self._known.move_to_end(user_id)
+        return True
+
+    def remember(self, user: User) -> None:
+        """Запишет пользователя в БД в течение interval секунд."""
+        if self.is_known(user.id) or user.id in self._pending:
+            return
+        self._pending[user.id] = self._row(user)
+        if len(self._pending) >= self.batch_size:
+            self._start_flush(0)
+        elif self._timer is None:
+            self._start_flush(self.interval)
+
+    async def ensure(self, session: AsyncSession, user: User) -> None:
+        """Гарантирует, что пользователь уже есть в БД."""
+        if self.is_known(user.id):
+            return
+        # Заодно записываем всех накопленных. Строка может уже
+        # записываться фоновой задачей - повторная вставка безопасна
+        # благодаря ON CONFLICT DO NOTHING
+        rows = self._pending
+        self._pending = {}
+        rows.setdefault(user.id, self._row(user))
+        try:
+            await self._write(session, rows)
+        except BaseException:
+            self._requeue(rows)
+            raise
+
+    @staticmethod
+    def _row(user: User) -> dict:
+        return {
+            "user_id": user.id,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "phone": None,
+        }
+
+    def _requeue(self, rows: dict) -> None:
+        for user_id, row in rows.items():
+            self._pending.setdefault(user_id, row)
+        if self._pending and self._timer is None:
+            self._start_flush(self.interval)
+
+    def _start_flush(self, delay: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        # Чистый контекст: фоновая запись не попадает в метрики апдейта
+        self._timer = asyncio.create_task(
+            self._flush_later(delay),
+            context=contextvars.Context()
+        )
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._timer = None
+        rows = self._pending
+        self._pending = {}
+        try:
+            async with self.session_pool() as session:
+                await self._write(session, rows)
+        except Exception:
+            logger.exception("Failed to register %d users", len(rows))
+            self._requeue(rows)
+
+    async def _write(self, session: AsyncSession, rows: dict) -> None:
+        values = list(rows.values())
+        for start in range(0, len(values), self.batch_size):
+            await orm_add_users(
+                session,
+                values[start:start + self.batch_size]
+            )
+        for user_id in rows:
+            self._known[user_id] = None
+        while len(self._known) > self.known_size:
+            self._known.popitem(last=False)
+
+    async def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            await self._flush_later(0)
+        if self._timer is not None:
+            # Запись не удалась и снова запланирована - не ждем ее
+            self._timer.cancel()
+            self._timer = None
+
+
+user_registry = UserRegistry(session_maker)
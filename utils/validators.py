@@ -0,0 +1,44 @@
+from decimal import Decimal, InvalidOperation
+
+NAME_MIN_LENGTH = 5
+NAME_MAX_LENGTH = 150
+DESCRIPTION_MIN_LENGTH = 5
+# Ограничения колонок Product: Numeric(20, 2) и String(150)
+PRICE_MAX = Decimal(10) ** 18
+IMAGE_MAX_LENGTH = 150
+
+
+def validate_name(name: str) -> str | None:
+    """Возвращает текст ошибки или None, если название подходит."""
+    if not NAME_MIN_LENGTH <= len(name) <= NAME_MAX_LENGTH:
+        return (
+            f"Название товара не должно превышать {NAME_MAX_LENGTH} "
+            "символов или быть менее 5ти символов"
+        )
+    return None
+
+
+def validate_description(description: str) -> str | None:
+    if len(description) < DESCRIPTION_MIN_LENGTH:
+        return "Слишком короткое описание"
+    return None
+
+
+def validate_price(price: str) -> str | None:
+    try:
+        value = Decimal(str(price).strip())
+    except InvalidOperation:
+        return "Введите корректное значение цены"
+    if not value.is_finite() or value < 0:
+        return "Введите корректное значение цены"
+    if value >= PRICE_MAX:
+        return "Слишком большая цена"
+    return None
+
+
+def validate_image(image: str) -> str | None:
+    if len(image) > IMAGE_MAX_LENGTH:
+        return (
+            f"Идентификатор изображения длиннее {IMAGE_MAX_LENGTH} символов"
+        )
+    return None
@@ -0,0 +1,41 @@
+import asyncio
+import logging
+
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """
+    Отвечает Telegram сразу, а апдейт обрабатывает фоновой задачей.
+    При остановке сервера close() дожидается незавершенных апдейтов
+    (не дольше drain_timeout секунд), но сессию бота не закрывает:
+    после него shutdown диспетчера еще отправляет отложенные правки.
+    Сессию закрывает close_bot_session, его регистрируют в on_shutdown
+    последним - после setup_application.
+    """
+
+    def __init__(self, *args, drain_timeout: float = 30, **kwargs) -> None:
+        kwargs.setdefault("handle_in_background", True)
+        super().__init__(*args, **kwargs)
+        self.drain_timeout = drain_timeout
+
+    async def close(self) -> None:
+        pending = set(self._background_feed_update_tasks)
+        if pending:
+            logger.info("Draining %d webhook update(s)", len(pending))
+            _, not_done = await asyncio.wait(
+                pending,
+                timeout=self.drain_timeout
+            )
+            for task in not_done:
+                task.cancel()
+            if not_done:
+                logger.warning(
+                    "Cancelled %d update(s) after drain timeout",
+                    len(not_done)
+                )
+
+    async def close_bot_session(self, *args) -> None:
+        await super().close()